@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарки локальных горячих участков конвейера на синтетических данных
+
+Замеряются:
+    - caption_layout: построение подписи, entities и медиа-областей (build_story_layout)
+    - group_users: разбиение пользователей на группы и распределение по аккаунтам (main.py)
+    - users_cache_save / users_cache_lookup: сохранение и поиск в кэше ContactChecker
+    - history_append: дозапись одной публикации в историю заданного размера
+    - story_discovery: сканирование директории сторис каталогом медиа
+
+Результаты сравниваются с сохраненными базовыми значениями (benchmarks/baselines.json).
+Скрипт завершается с ошибкой, если замер медленнее базового больше чем на допуск.
+
+Использование:
+    python benchmarks/hot_paths.py [--sizes 1000,10000,100000,1000000] [--update-baselines]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(BASE_DIR), str(BASE_DIR / 'src')]
+
+from main import split_into_groups, assign_groups
+from utils.story_publisher import build_story_layout
+from utils.user_cache import UserCache
+from utils.user_record import UserRecord
+from utils.history_store import HistoryStore
+from utils.media_catalog import MediaCatalog
+from telethon import types
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+# Сообщения модулей приложения во время замеров не нужны
+logging.getLogger('utils').setLevel(logging.ERROR)
+
+BASELINES_FILE = BASE_DIR / 'benchmarks' / 'baselines.json'
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+USERS_PER_STORY = 10
+ACCOUNTS = 4
+LOOKUPS = 1000
+APPENDS = 200
+
+
+def synthetic_users(count):
+    """Синтетические данные найденных пользователей"""
+    return [
+        UserRecord(100000000 + i, f"user_{i}", f"Name{i}", '', access_hash=i * 7, account_id=1)
+        for i in range(count)
+    ]
+
+
+def bench_caption_layout(size, workdir):
+    """Построение подписей для всех групп из size пользователей"""
+    users = synthetic_users(size)
+    groups = split_into_groups(
+        [(user, types.InputPeerUser(user.user_id, user.access_hash)) for user in users],
+        USERS_PER_STORY
+    )
+    start = time.perf_counter()
+    for group in groups:
+        build_story_layout(group)
+    return time.perf_counter() - start
+
+
+def bench_group_users(size, workdir):
+    """Разбиение size пользователей на группы и распределение по аккаунтам"""
+    users = synthetic_users(size)
+    start = time.perf_counter()
+    assign_groups(split_into_groups(users, USERS_PER_STORY), ACCOUNTS)
+    return time.perf_counter() - start
+
+
+def bench_users_cache_save(size, workdir):
+    """Сохранение size пользователей в кэш"""
+    users = synthetic_users(size)
+    cache = UserCache(os.path.join(workdir, 'users.db'), legacy_file=None)
+    start = time.perf_counter()
+    cache.put_many(users)
+    cache.flush()
+    elapsed = time.perf_counter() - start
+    cache.close()
+    return elapsed
+
+
+def bench_users_cache_lookup(size, workdir):
+    """Время одного поиска по юзернейму в кэше из size пользователей"""
+    cache = UserCache(os.path.join(workdir, 'users.db'), legacy_file=None)
+    cache.put_many(synthetic_users(size))
+    cache.flush()
+    step = max(1, size // LOOKUPS)
+    start = time.perf_counter()
+    for i in range(0, size, step):
+        cache.get_by_username(f"user_{i}")
+    elapsed = (time.perf_counter() - start) / len(range(0, size, step))
+    cache.close()
+    return elapsed
+
+
+def bench_history_append(size, workdir):
+    """Время одной дозаписи в историю, уже содержащую size публикаций"""
+    store = HistoryStore(os.path.join(workdir, 'history.db'), legacy_file=None)
+    base_date = datetime.datetime(2025, 1, 1)
+    with store.conn:
+        for i in range(size):
+            store._insert({
+                'date': (base_date + datetime.timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+                'story_file': f"story_{i % 5}.jpg",
+                'users_mentioned': [f"user_{(i + j) % 1000}" for j in range(USERS_PER_STORY)],
+                'success': True
+            })
+    entry = {
+        'date': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'story_file': 'story_0.jpg',
+        'users_mentioned': [f"user_{j}" for j in range(USERS_PER_STORY)],
+        'success': True
+    }
+    start = time.perf_counter()
+    for _ in range(APPENDS):
+        store.append(entry)
+    elapsed = (time.perf_counter() - start) / APPENDS
+    store.close()
+    return elapsed
+
+
+def bench_story_discovery(size, workdir, max_files):
+    """Первичное сканирование директории сторис из size файлов (None, если больше max_files)"""
+    if size > max_files:
+        return None
+    stories_dir = os.path.join(workdir, 'stories')
+    os.makedirs(stories_dir)
+    for i in range(size):
+        with open(os.path.join(stories_dir, f"story_{i}.jpg"), 'wb') as f:
+            f.write(b'\xff\xd8' + i.to_bytes(4, 'big'))
+    catalog = MediaCatalog(stories_dir, os.path.join(workdir, 'media.db'))
+    start = time.perf_counter()
+    catalog.refresh(force=True)
+    elapsed = time.perf_counter() - start
+    catalog.close()
+    return elapsed
+
+
+def run_benchmarks(sizes, repeat, max_files):
+    """Выполняет все бенчмарки и возвращает минимальное время для каждого размера"""
+    benchmarks = {
+        'caption_layout': bench_caption_layout,
+        'group_users': bench_group_users,
+        'users_cache_save': bench_users_cache_save,
+        'users_cache_lookup': bench_users_cache_lookup,
+        'history_append': bench_history_append,
+        'story_discovery': lambda size, workdir: bench_story_discovery(size, workdir, max_files),
+    }
+    results = {}
+    for name, bench in benchmarks.items():
+        results[name] = {}
+        for size in sizes:
+            timings = []
+            for _ in range(repeat):
+                workdir = tempfile.mkdtemp(prefix='tg_stories_bench_')
+                try:
+                    elapsed = bench(size, workdir)
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+                if elapsed is None:
+                    break
+                timings.append(elapsed)
+            if not timings:
+                logger.info("%s [%s]: пропущено", name, size)
+                continue
+            results[name][str(size)] = min(timings)
+            logger.info("%s [%s]: %.3f мс", name, size, min(timings) * 1000)
+    return results
+
+
+def compare(results, baselines, tolerance):
+    """
+    Сравнение замеров с базовыми значениями
+
+    Returns:
+        tuple: (описания регрессий, замеры без базовых значений)
+    """
+    regressions = []
+    missing = []
+    for name, timings in results.items():
+        for size, elapsed in timings.items():
+            baseline = baselines.get(name, {}).get(size)
+            if baseline is None:
+                missing.append(f"{name} [{size}]")
+                continue
+            if elapsed > baseline * (1 + tolerance):
+                regressions.append(
+                    f"{name} [{size}]: {elapsed * 1000:.3f} мс против базовых {baseline * 1000:.3f} мс"
+                )
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих участков конвейера")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="Размеры синтетических данных через запятую (до 1000000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Количество повторов каждого замера")
+    parser.add_argument('--max-files', type=int, default=10000,
+                        help="Ограничение количества файлов для story_discovery")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Допустимое замедление относительно базовых значений (0.5 = 50%%)")
+    parser.add_argument('--baselines', default=str(BASELINES_FILE), help="Файл базовых значений")
+    parser.add_argument('--update-baselines', action='store_true',
+                        help="Сохранить текущие замеры как базовые значения")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    results = run_benchmarks(sizes, args.repeat, args.max_files)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, 'r', encoding='utf-8') as f:
+            baselines = json.load(f)
+
+    if args.update_baselines:
+        for name, timings in results.items():
+            baselines.setdefault(name, {}).update(timings)
+        with open(args.baselines, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+        logger.info("Базовые значения сохранены в %s", args.baselines)
+        return 0
+
+    regressions, missing = compare(results, baselines, args.tolerance)
+    for name in missing:
+        # Без базового значения регрессию не обнаружить, поэтому пропуск не должен быть тихим
+        logger.warning("Нет базового значения: %s (сохраните его через --update-baselines)", name)
+    for regression in regressions:
+        logger.error("Регрессия: %s", regression)
+    if not regressions:
+        logger.info("Регрессий не обнаружено")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк времени холодного старта: импорт модулей, нужных main.py до первого запроса
+
+Каждый замер выполняется в отдельном процессе. Скрипт завершается с ошибкой, если
+медиана времени импорта превышает бюджет или при импорте загружаются тяжелые
+модули, которые должны подгружаться лениво (pandas, tqdm).
+
+Использование:
+    python benchmarks/import_time.py [--runs 7] [--budget 1.0]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Модули, которые не должны загружаться при старте
+LAZY_MODULES = ('pandas', 'tqdm')
+
+# Бюджет времени импорта в секундах по умолчанию
+DEFAULT_BUDGET = 1.0
+
+PROBE = """
+import json, sys, time
+sys.path[:0] = [{base!r}, {src!r}]
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'elapsed': elapsed,
+    'loaded': [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_once():
+    """Один замер времени импорта в новом процессе"""
+    code = PROBE.format(base=str(BASE_DIR), src=str(BASE_DIR / 'src'), lazy=LAZY_MODULES)
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True, check=True, text=True, cwd=str(BASE_DIR),
+        env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк времени импорта main.py")
+    parser.add_argument('--runs', type=int, default=7, help="Количество замеров")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="Допустимая медиана времени импорта в секундах")
+    args = parser.parse_args()
+
+    timings = []
+    loaded = set()
+    for _ in range(args.runs):
+        result = measure_once()
+        timings.append(result['elapsed'])
+        loaded.update(result['loaded'])
+
+    median = statistics.median(timings)
+    logger.info("Импорт main.py: медиана %.1f мс, минимум %.1f мс (%s замеров)",
+                median * 1000, min(timings) * 1000, args.runs)
+
+    failed = False
+    if loaded:
+        logger.error("При старте загружены модули, которые должны импортироваться лениво: %s", sorted(loaded))
+        failed = True
+    if median > args.budget:
+        logger.error("Время импорта %.3f с превышает бюджет %.3f с", median, args.budget)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,90 @@
 import os
+import warnings
 from pathlib import Path
 
+
+def _env_number(name, default, cast=float):
+    """
+    Числовая настройка из переменной окружения
+
+    Некорректное значение не прерывает импорт настроек: выводится
+    предупреждение и используется значение по умолчанию
+    """
+    value = os.environ.get(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        warnings.warn(f"Некорректное значение {name}={value!r}, используется {default}")
+        return default
+
+
 # Базовые пути проекта
 BASE_DIR = Path(__file__).parent.parent
 CONTACTS_DIR = BASE_DIR / "data" / "contacts"
 STORIES_DIR = BASE_DIR / "data" / "stories"
 SESSIONS_DIR = BASE_DIR / "data" / "sessions"
 RESULTS_DIR = BASE_DIR / "data" / "results"
-
-# Создаем директории, если они не существуют
-os.makedirs(CONTACTS_DIR, exist_ok=True)
-os.makedirs(STORIES_DIR, exist_ok=True)
-os.makedirs(SESSIONS_DIR, exist_ok=True)
-os.makedirs(RESULTS_DIR, exist_ok=True)
+HISTORY_DIR = BASE_DIR / "data" / "history"
+PROCESSED_DIR = BASE_DIR / "data" / "processed"
 
 # Настройки приложения
 MAX_MENTIONS_PER_STORY = 30
-DELAY_BETWEEN_STORIES = 60  # Задержка между публикациями сторис в секундах
-MAX_RETRIES = 3  # Максимальное количество попыток при ошибках
+DELAY_BETWEEN_STORIES = _env_number('TG_STORIES_DELAY', 60, int)  # Задержка между публикациями сторис в секундах
+MAX_RETRIES = 3  # Максимальное количество повторов запроса при ошибках (всего попыток - на одну больше)
+RETRY_BASE_DELAY = 1.0  # Начальная пауза перед повтором запроса в секундах (растет экспоненциально)
+RETRY_MAX_DELAY = 30.0  # Максимальная пауза перед повтором запроса в секундах
+MAX_FLOOD_WAIT = 300  # Максимальное ожидание по FloodWait в секундах (при большем ожидании запрос не повторяется)
+PHONE_CHECK_INTERVAL = 0.5  # Минимальный интервал между проверками номеров в секундах
+USERNAME_CHECK_INTERVAL = 1.0  # Минимальный интервал между проверками юзернеймов в секундах
+USERS_CACHE_TTL = 30 * 24 * 3600  # Время жизни записи в кэше пользователей в секундах
+USERS_CACHE_MAX_ENTRIES = 100000  # Максимальное количество записей в кэше пользователей
+UPLOAD_CACHE_TTL = 24 * 3600  # Время повторного использования загруженного медиафайла в секундах
+STORIES_CHECK_TTL = 3600  # Время кэширования проверки доступности сторис для аккаунта в секундах
+MEDIA_RESCAN_INTERVAL = 60  # Минимальный интервал между сканированиями директории сторис в секундах
+CHECKPOINT_INTERVAL = 50  # Сохранять контрольную точку проверки контактов каждые N проверок
+MENTION_COOLDOWN = 24 * 3600  # Не упоминать пользователя повторно в течение N секунд после публикации (0 - без ограничения)
+HISTORY_HOT_DAYS = 30  # Записи истории старше N дней переносятся в сжатый архив
+HISTORY_MAX_HOT_ROWS = 100000  # Максимум записей истории в базе, более старые переносятся в архив (0 - без ограничения)
+SCHEDULER_POLL_INTERVAL = 30  # Интервал проверки очереди заданий планировщиком в секундах
+
+# Подготовка медиафайлов к формату сторис
+STORY_WIDTH = 1080
+STORY_HEIGHT = 1920
+STORY_MAX_DURATION = 60  # Максимальная длительность видео сторис в секундах
+PREPROCESS_WORKERS = None  # Количество процессов подготовки медиа (None - по числу ядер)
+
+# Офлайн-имитация Telegram API для бенчмарков (включается переменной окружения TG_STORIES_FAKE=1)
+FAKE_TELEGRAM = os.environ.get('TG_STORIES_FAKE') == '1'
+FAKE_ACCOUNTS = _env_number('TG_STORIES_FAKE_ACCOUNTS', 2, int)  # Количество имитируемых аккаунтов
+FAKE_LATENCY = _env_number('TG_STORIES_FAKE_LATENCY', 0.05)  # Средняя задержка запроса в секундах
+FAKE_UPLOAD_SPEED = _env_number('TG_STORIES_FAKE_UPLOAD_SPEED', 5 * 1024 * 1024, int)  # Байт в секунду
+FAKE_ERROR_RATE = _env_number('TG_STORIES_FAKE_ERROR_RATE', 0.0)  # Доля запросов с ошибкой
+FAKE_FOUND_RATE = _env_number('TG_STORIES_FAKE_FOUND_RATE', 0.8)  # Доля существующих пользователей
 
 # Пути к файлам
 ACCOUNTS_CONFIG = BASE_DIR / "configs" / "accounts.json"
 DEFAULT_CONTACTS_FILE = CONTACTS_DIR / "contacts.csv"
+HISTORY_DB = HISTORY_DIR / "publishing_history.db"
+LEGACY_HISTORY_FILE = HISTORY_DIR / "publishing_history.json"
+USERS_CACHE_DB = RESULTS_DIR / "users_cache.db"
+LEGACY_USERS_CACHE_FILE = RESULTS_DIR / "users_cache.json"
+UPLOAD_CACHE_DB = RESULTS_DIR / "upload_cache.db"
+MEDIA_CATALOG_DB = RESULTS_DIR / "media_catalog.db"
+METRICS_FILE = RESULTS_DIR / "metrics.prom"
+CHECKPOINT_DB = RESULTS_DIR / "checkpoints.db"
+JOB_QUEUE_DB = RESULTS_DIR / "job_queue.db"  # Очередь заданий планировщика
+SUPPRESSION_DB = RESULTS_DIR / "suppression.db"  # Пользователи, отказавшиеся от упоминаний
+DRY_RUN_HISTORY_DB = HISTORY_DIR / "dry_run_history.db"  # История пробных запусков (отдельно от настоящей)
+DRY_RUN_REQUESTS_FILE = RESULTS_DIR / "dry_run_requests.jsonl"  # Запросы SendStoryRequest пробного запуска
+DRY_RUN_REPORT_FILE = RESULTS_DIR / "dry_run_report.txt"  # Отчет пробного запуска
+LOG_FILE = BASE_DIR / "telegram_stories.log"
+LOG_JSON_FILE = BASE_DIR / "telegram_stories.jsonl"  # Структурированный лог (одна запись JSON в строке)
+LOG_LEVEL = os.environ.get('TG_STORIES_LOG_LEVEL', 'INFO')
+
+
+def ensure_directories():
+    """Создает рабочие директории, если они не существуют (не вызывается при импорте)"""
+    for directory in (CONTACTS_DIR, STORIES_DIR, SESSIONS_DIR, RESULTS_DIR, HISTORY_DIR, PROCESSED_DIR):
+        os.makedirs(directory, exist_ok=True)
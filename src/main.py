@@ -11,10 +11,14 @@ Telegram Stories Automator - Основной скрипт запуска
 
 import os
 import sys
+import argparse
 import logging
 import json
 import asyncio
 import random
+import itertools
+import time
+import datetime
 from pathlib import Path
 
 # Добавляем корневую директорию проекта в PATH
@@ -23,159 +27,492 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from utils.account_manager import AccountManager
 from utils.contact_checker import ContactChecker
 from utils.story_publisher import StoryPublisher
-from configs.settings import CONTACTS_DIR, STORIES_DIR, RESULTS_DIR, BASE_DIR, DELAY_BETWEEN_STORIES
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(os.path.join(BASE_DIR, 'telegram_stories.log'))
-    ]
+from utils.user_cache import close_shared_caches
+from utils.history_store import close_shared_histories
+from utils.upload_cache import close_shared_upload_cache
+from utils.background_writer import close_shared_writer
+from utils.media_catalog import get_shared_catalog, close_shared_catalogs
+from utils.media_preprocessor import get_shared_preprocessor, close_shared_preprocessor, check_media_dependencies
+from utils.metrics import get_shared_metrics
+from utils.job_spec import build_job, interactive_job, STORY_SELECTIONS
+from utils.checkpoint_store import CheckpointStore, account_key
+from utils.retry_policy import Pacer
+from utils.user_record import unique_users
+from utils.mention_cooldown import get_shared_cooldown, close_shared_cooldown
+from utils.suppression_list import get_shared_suppression, close_shared_suppression
+from utils.log_setup import setup_logging
+from utils.background_writer import get_shared_writer
+from utils.dry_run import write_report
+from utils.job_queue import JobQueue, parse_run_at
+from configs.settings import (
+    STORIES_DIR, BASE_DIR, DRY_RUN_REQUESTS_FILE, DRY_RUN_REPORT_FILE, SCHEDULER_POLL_INTERVAL, ensure_directories
 )
+
 logger = logging.getLogger(__name__)
 
-async def main():
-    """Основная функция запуска приложения"""
+def parse_args(argv=None):
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Telegram Stories Automator")
+    parser.add_argument('--job', help="JSON-файл задания (параметры командной строки имеют приоритет)")
+    parser.add_argument('--mode', choices=['phone', 'username'], help="Режим проверки контактов")
+    parser.add_argument('--input', dest='input_file', help="Файл с номерами или юзернеймами (относительно data/contacts)")
+    parser.add_argument('--output', dest='output_file', help="CSV-файл для найденных по номеру пользователей")
+    parser.add_argument('--publish', dest='publish', action='store_true', default=None,
+                        help="Публиковать сторис без подтверждения")
+    parser.add_argument('--no-publish', dest='publish', action='store_false',
+                        help="Только проверить контакты, не публикуя сторис")
+    parser.add_argument('--stories', dest='story_files', nargs='+',
+                        help="Файлы сторис (относительно data/stories), по умолчанию все файлы директории")
+    parser.add_argument('--story-selection', choices=STORY_SELECTIONS,
+                        help="Выбор файла для очередной сторис: случайно или по порядку")
+    parser.add_argument('--seed', type=int, help="Зерно генератора для воспроизводимого случайного выбора сторис")
+    parser.add_argument('--users-per-story', type=int, help="Максимум упоминаний в одной сторис")
+    parser.add_argument('--delay', type=float, help="Задержка между публикациями и между аккаунтами, с")
+    parser.add_argument('--mention-cooldown', type=float,
+                        help="Не упоминать пользователя повторно в течение N секунд после публикации (0 - без ограничения)")
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true', default=None,
+                        help="Пробный запуск: построить запросы публикации без отправки в Telegram")
+    parser.add_argument('--suppress', nargs='+', metavar='USER',
+                        help="Добавить пользователей в список исключений (юзернейм, ID или номер с '+') и выйти")
+    parser.add_argument('--unsuppress', nargs='+', metavar='USER',
+                        help="Удалить пользователей из списка исключений и выйти")
+    parser.add_argument('--schedule', metavar='TIME',
+                        help="Добавить задание в очередь планировщика и выйти (время ISO 8601, например "
+                             "2026-01-31T18:00, или +N - через N секунд)")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Запустить планировщик: выполнять задания очереди в назначенное время, не отключая клиенты")
+    parser.add_argument('--list-jobs', action='store_true', help="Показать очередь заданий планировщика и выйти")
+    parser.add_argument('--cancel-job', type=int, metavar='ID', help="Отменить задание из очереди и выйти")
+    parser.add_argument('--resume', action='store_true',
+                        help="Продолжить прерванный запуск того же задания без повторных проверок и публикаций")
+    parser.add_argument('--profile', action='store_true',
+                        help="Профилировать запуск (cProfile и tracemalloc), результаты сохраняются рядом с telegram_stories.log")
+    parser.add_argument('--profile-top', type=int, default=30,
+                        help="Количество позиций в сводке профилирования")
+    return parser.parse_args(argv)
+
+def job_from_args(args):
+    """
+    Задание из файла и аргументов командной строки или, если режим не задан,
+    по ответам пользователя
+    """
+    overrides = {
+        key: getattr(args, key)
+        for key in ('mode', 'input_file', 'output_file', 'publish', 'story_files',
+                    'story_selection', 'seed', 'users_per_story', 'delay', 'mention_cooldown', 'dry_run')
+    }
+    if args.job or args.mode:
+        return build_job(args.job, overrides)
+    return interactive_job()
+
+def split_into_groups(users, group_size):
+    """
+    Разбивает пользователей на группы для упоминания в одной сторис
+    
+    Args:
+        users (list): Найденные пользователи
+        group_size (int): Максимальное количество упоминаний в одной сторис
+    
+    Returns:
+        list: Группы пользователей
+    """
+    return [users[i:i+group_size] for i in range(0, len(users), group_size)]
+
+def assign_groups(user_groups, accounts_count):
+    """Распределяет группы упоминаний между аккаунтами по кругу"""
+    return [user_groups[i::accounts_count] for i in range(accounts_count)]
+
+def make_story_picker(story_files, selection='random', seed=None):
+    """
+    Возвращает функцию выбора файла для очередной сторис
+    
+    Args:
+        story_files (list): Файлы сторис
+        selection (str): 'random' - случайный файл, 'sequential' - файлы по порядку
+        seed (int, optional): Зерно генератора для воспроизводимого случайного выбора
+    
+    Returns:
+        callable: Функция без аргументов, возвращающая путь к файлу
+    """
+    if selection == 'sequential':
+        files = itertools.cycle(story_files)
+        return lambda: next(files)
+    rng = random.Random(seed)
+    return lambda: rng.choice(story_files)
+
+def update_suppression(args):
+    """Изменение списка исключений по аргументам --suppress и --unsuppress"""
+    suppression = get_shared_suppression()
     try:
-        logger.info("Запуск Telegram Stories Automator")
+        if args.suppress:
+            logger.info("Добавлено в список исключений: %s", suppression.add(args.suppress, reason='cli'))
+        if args.unsuppress:
+            logger.info("Удалено из списка исключений: %s", suppression.remove(args.unsuppress))
+        logger.info("Записей в списке исключений: %s", len(suppression))
+    finally:
+        close_shared_suppression()
+
+async def run_job(job, clients, checkpoints, resume=False):
+    """
+    Выполнение задания подключенными клиентами: проверка контактов и
+    публикация сторис с упоминаниями
+    
+    Args:
+        job (dict): Задание (см. utils.job_spec): режим проверки, файл контактов,
+            выбор сторис и параметры публикации. Если job['publish'] равно None,
+            подтверждение публикации запрашивается у пользователя.
+        clients (list): Подключенные клиенты (AccountManager.setup_clients)
+        checkpoints (CheckpointStore): Контрольные точки
+        resume (bool): Продолжить прерванный запуск задания с контрольной точки
+    
+    Returns:
+        bool: True, если задание выполнено полностью
+    """
+    # Список исключений мог измениться из другого процесса (--suppress), пока работал планировщик
+    get_shared_suppression().reload()
+    # Контрольные точки: результаты проверок и план публикаций сохраняются по ходу работы
+    run_id = checkpoints.start_run(job, resume=resume)
+    try:
+        completed = await lookup_and_publish(job, clients, checkpoints, run_id)
+        if completed:
+            checkpoints.set_status(run_id, 'done')
+        return completed
+    finally:
+        # Результаты и метрики задания записываются на диск до перехода к следующему
+        get_shared_writer().flush()
+        get_shared_metrics().export()
+
+async def lookup_and_publish(job, clients, checkpoints, run_id):
+    """
+    Проверка контактов и публикация сторис в рамках запуска run_id
+    
+    Returns:
+        bool: True, если задание выполнено полностью (или публиковать нечего)
+    """
+    # Проверяем существование контактов и получаем список найденных
+    found_users = []
+    input_file = job['input_file']
+    
+    if job['mode'] == 'phone':
+        logger.info("Проверка контактов из файла %s", input_file)
+    else:
+        logger.info("Проверка юзернеймов из файла %s", input_file)
+    
+    for i, client in enumerate(clients):
+        checker = ContactChecker(client, checkpoint=checkpoints.lookup_checkpoint(run_id, account_key(client)))
+        if job['mode'] == 'phone':
+            # Проверка по номеру телефона
+            users = await checker.process_contacts_file(input_file, job['output_file'])
+        else:
+            # Проверка по юзернейму
+            users = await checker.check_usernames_from_file(input_file)
+        found_users.extend(users)
         
-        # Проверяем наличие необходимых директорий
-        os.makedirs(CONTACTS_DIR, exist_ok=True)
-        os.makedirs(STORIES_DIR, exist_ok=True)
-        os.makedirs(RESULTS_DIR, exist_ok=True)
+        if i < len(clients) - 1 and not job['dry_run']:
+            # Задержка между аккаунтами, чтобы не перегружать API (пробный запуск не ждет,
+            # запросы проверки в нем ограничены интервалами ContactChecker)
+            logger.info("Ожидание перед проверкой с нового аккаунта...")
+            await asyncio.sleep(job['delay'])
+    
+    # Пользователь, найденный несколькими аккаунтами, упоминается один раз
+    found_users = unique_users(found_users)
+    
+    if not found_users:
+        logger.warning("Не найдено ни одного пользователя для упоминания")
+        return True
+    
+    logger.info("Найдено %s пользователей для упоминания", len(found_users))
+    
+    # Публикация сторис с упоминаниями
+    # Пробный запуск ничего не публикует, поэтому подтверждение не нужно
+    should_publish = True if job['dry_run'] else job['publish']
+    if should_publish is None:
+        should_publish = input("Опубликовать сторис с упоминаниями? (y/n): ").lower() == 'y'
+    if not should_publish:
+        logger.info("Публикация отменена пользователем")
+        return True
+    
+    # План публикаций сохраняется до начала публикации, чтобы продолжить его после сбоя
+    if not checkpoints.has_publish_queue(run_id):
+        # Проверяем наличие файлов сторис (метаданные кэшируются в каталоге)
+        story_files = job['story_files'] or get_shared_catalog().files()
         
-        # Получаем список аккаунтов
-        account_manager = AccountManager()
-        clients = await account_manager.setup_clients()
+        if not story_files:
+            logger.error("В директории %s не найдены файлы для сторис", STORIES_DIR)
+            return False
         
-        if not clients:
-            logger.error("Не удалось загрузить ни одного аккаунта")
-            return
+        logger.info("Найдено %s файлов для сторис", len(story_files))
         
-        logger.info(f"Загружено {len(clients)} аккаунтов")
+        # Недавно упомянутые пользователи не попадают в план публикаций
+        found_users, skipped = get_shared_cooldown().filter(found_users, job['mention_cooldown'])
+        if skipped:
+            logger.info("Пропущено %s пользователей, упомянутых за последние %s с", skipped, job['mention_cooldown'])
+        if not found_users:
+            logger.warning("Все найденные пользователи недавно упоминались, публиковать нечего")
+            return True
         
-        # Проверяем существование контактов и получаем список найденных
-        mode = input("Выберите режим проверки (1 - по номеру телефона, 2 - по юзернейму): ")
+        next_story_file = make_story_picker(story_files, job['story_selection'], job['seed'])
         
-        found_users = []
+        users_per_story = min(job['users_per_story'], len(found_users))
         
-        if mode == "1":
-            # Проверка по номеру телефона
-            contacts_file = input(f"Введите путь к файлу с номерами (или нажмите Enter для 'contacts_example.csv'): ")
-            if not contacts_file:
-                contacts_file = os.path.join(CONTACTS_DIR, 'contacts_example.csv')
-            elif not os.path.isabs(contacts_file) and not contacts_file.startswith(CONTACTS_DIR):
-                # Если путь не абсолютный и не начинается с CONTACTS_DIR, добавляем CONTACTS_DIR
-                contacts_file = os.path.join(CONTACTS_DIR, contacts_file)
-            
-            logger.info(f"Проверка контактов из файла {contacts_file}")
-            
-            for i, client in enumerate(clients):
-                checker = ContactChecker(client)
-                user_contacts = await checker.check_contacts_from_file(contacts_file)
-                found_users.extend(user_contacts)
-                
-                if i < len(clients) - 1:
-                    # Задержка между аккаунтами, чтобы не перегружать API
-                    logger.info(f"Ожидание перед проверкой с нового аккаунта...")
-                    await asyncio.sleep(DELAY_BETWEEN_STORIES)
-        
-        elif mode == "2":
-            # Проверка по юзернейму
-            usernames_file = input(f"Введите путь к файлу с юзернеймами (или нажмите Enter для 'contacts_test.csv'): ")
-            if not usernames_file:
-                usernames_file = os.path.join(CONTACTS_DIR, 'contacts_test.csv')
-            elif not os.path.isabs(usernames_file) and not usernames_file.startswith(CONTACTS_DIR):
-                # Если путь не абсолютный и не начинается с CONTACTS_DIR, добавляем CONTACTS_DIR
-                usernames_file = os.path.join(CONTACTS_DIR, usernames_file)
+        # Разбиваем пользователей на группы и распределяем их между аккаунтами
+        user_groups = split_into_groups(found_users, users_per_story)
+        groups_by_account = assign_groups(user_groups, len(clients))
+        checkpoints.create_publish_queue(run_id, [
+            (account_key(client), next_story_file(), group)
+            for client, account_groups in zip(clients, groups_by_account)
+            for group in account_groups
+        ])
+    else:
+        logger.info("Продолжение публикации по сохраненному плану")
+    
+    pending = checkpoints.pending_publications(run_id)
+    total_planned = len(pending)
+    
+    # Заранее подготавливаем медиафайлы к формату сторис в пуле процессов
+    await get_shared_preprocessor().prepare(sorted({story_file for _, _, story_file, _ in pending}))
+    
+    if job['dry_run']:
+        logger.info("Пробный запуск: запросы публикации будут записаны в %s", DRY_RUN_REQUESTS_FILE)
+        if os.path.exists(DRY_RUN_REQUESTS_FILE):
+            os.remove(DRY_RUN_REQUESTS_FILE)
+    
+    # Публикуем сторис по очереди с разных аккаунтов
+    total_published = 0
+    
+    for i, client in enumerate(clients):
+        publisher = StoryPublisher(client, dry_run=job['dry_run'])
+        
+        # Получаем невыполненные публикации текущего аккаунта
+        account_queue = checkpoints.pending_publications(run_id, account_key(client))
+        if not account_queue:
+            continue
+        
+        logger.info("Публикация сторис с аккаунта %s с %s группами упоминаний", i+1, len(account_queue))
+        
+        # Интервал между публикациями аккаунта (время самой публикации входит в интервал)
+        pacer = Pacer(0 if job['dry_run'] else job['delay'])
+        
+        for position, _, story_file, group in account_queue:
+            await pacer.wait()
             
-            logger.info(f"Проверка юзернеймов из файла {usernames_file}")
+            # Публикуем сторис
+            result = await publisher.publish_story_with_mentions(group, story_file)
+            get_shared_writer().submit(checkpoints.mark_published, run_id, position, result)
             
-            for i, client in enumerate(clients):
-                checker = ContactChecker(client)
-                username_users = await checker.check_usernames_from_file(usernames_file)
-                found_users.extend(username_users)
-                
-                if i < len(clients) - 1:
-                    # Задержка между аккаунтами, чтобы не перегружать API
-                    logger.info(f"Ожидание перед проверкой с нового аккаунта...")
-                    await asyncio.sleep(DELAY_BETWEEN_STORIES)
-        
-        else:
-            logger.error("Неверный режим проверки")
-            return
+            if result:
+                total_published += 1
+                logger.info("Опубликована сторис %s/%s", total_published, total_planned)
+            else:
+                logger.warning("Не удалось опубликовать сторис с аккаунта %s", i+1)
+    
+    logger.info("Всего опубликовано %s сторис", total_published)
+    # Дожидаемся записи отметок о публикации и истории перед чтением очереди
+    get_shared_writer().flush()
+    
+    if job['dry_run']:
+        # Отчет: разбиение упоминаний по аккаунтам и сторис и время этапов
+        logger.info(write_report(DRY_RUN_REPORT_FILE, pending, get_shared_metrics().summary()))
+    
+    remaining = len(checkpoints.pending_publications(run_id))
+    if remaining:
+        logger.warning("Не выполнено %s публикаций, их можно повторить с параметром --resume", remaining)
+        return False
+    return True
+
+async def shutdown(account_manager, checkpoints):
+    """Закрытие клиентов, запись отложенных данных и сохранение метрик при завершении"""
+    # Закрываем все клиенты
+    try:
+        if account_manager:
+            await account_manager.close_all_clients()
+    except Exception as e:
+        logger.error("Ошибка при закрытии клиентов: %s", e)
+    # Дожидаемся фоновой записи истории, кэшей и контрольных точек
+    close_shared_writer()
+    if checkpoints:
+        checkpoints.close()
+    # Сохраняем общий кэш пользователей
+    close_shared_caches()
+    close_shared_cooldown()
+    close_shared_histories()
+    close_shared_upload_cache()
+    close_shared_preprocessor()
+    close_shared_catalogs()
+    close_shared_suppression()
+    # Сохраняем метрики длительности этапов и выводим сводку по запуску
+    try:
+        metrics = get_shared_metrics()
+        metrics.export()
+        logger.info(metrics.summary())
+    except Exception as e:
+        logger.error("Ошибка при сохранении метрик: %s", e)
+    logger.info("Программа завершена")
+
+async def main(job, resume=False):
+    """
+    Основная функция запуска приложения
+    
+    Args:
+        job (dict): Задание (см. utils.job_spec)
+        resume (bool): Продолжить прерванный запуск задания с контрольной точки
+    """
+    account_manager = None
+    checkpoints = None
+    try:
+        logger.info("Запуск Telegram Stories Automator")
         
-        if not found_users:
-            logger.warning("Не найдено ни одного пользователя для упоминания")
-            return
+        # Проверяем наличие необходимых директорий
+        ensure_directories()
+        check_media_dependencies()
         
-        logger.info(f"Найдено {len(found_users)} пользователей для упоминания")
+        # Получаем список аккаунтов
+        account_manager = AccountManager()
+        clients = await account_manager.setup_clients()
         
-        # Публикация сторис с упоминаниями
-        should_publish = input("Опубликовать сторис с упоминаниями? (y/n): ")
-        if should_publish.lower() != 'y':
-            logger.info("Публикация отменена пользователем")
+        if not clients:
+            logger.error("Не удалось загрузить ни одного аккаунта")
             return
         
-        # Проверяем наличие файлов сторис
-        story_files = [f for f in os.listdir(STORIES_DIR) 
-                      if os.path.isfile(os.path.join(STORIES_DIR, f)) 
-                      and f.lower().endswith(('.mp4', '.avi', '.mov', '.jpg', '.jpeg', '.png'))]
+        logger.info("Загружено %s аккаунтов", len(clients))
         
-        if not story_files:
-            logger.error(f"В директории {STORIES_DIR} не найдены файлы для сторис")
-            return
+        checkpoints = CheckpointStore()
+        await run_job(job, clients, checkpoints, resume=resume)
+        
+    except KeyboardInterrupt:
+        logger.info("Работа программы прервана пользователем")
+    except Exception as e:
+        logger.error("Ошибка при выполнении программы: %s", e)
+    finally:
+        await shutdown(account_manager, checkpoints)
+
+async def daemon(poll_interval=SCHEDULER_POLL_INTERVAL):
+    """
+    Планировщик: выполняет задания из очереди в назначенное время
+    
+    Клиенты подключаются и авторизуются один раз при запуске, а кэши
+    пользователей, загрузок, медиа и индекс упоминаний остаются в памяти
+    между заданиями. Перед каждым заданием переподключаются только клиенты,
+    потерявшие соединение. Очередь перечитывается не реже раза в poll_interval
+    секунд, поэтому задания можно добавлять, не останавливая планировщик.
+    
+    Args:
+        poll_interval (float): Максимальный интервал между проверками очереди, с
+    """
+    account_manager = None
+    checkpoints = None
+    queue = None
+    try:
+        logger.info("Запуск планировщика Telegram Stories Automator")
+        ensure_directories()
+        check_media_dependencies()
         
-        logger.info(f"Найдено {len(story_files)} файлов для сторис")
+        queue = JobQueue()
+        recovered = queue.recover_interrupted()
+        if recovered:
+            logger.info("Возвращено в очередь %s прерванных заданий", recovered)
         
-        # Публикуем сторис по очереди с разных аккаунтов
-        total_published = 0
-        users_per_story = min(10, len(found_users))  # Максимум 10 упоминаний на одну сторис
+        account_manager = AccountManager()
+        clients = await account_manager.setup_clients()
+        if not clients:
+            logger.error("Не удалось загрузить ни одного аккаунта")
+            return
         
-        # Разбиваем пользователей на группы
-        user_groups = [found_users[i:i+users_per_story] for i in range(0, len(found_users), users_per_story)]
+        logger.info("Загружено %s аккаунтов, ожидание заданий", len(clients))
+        checkpoints = CheckpointStore()
         
-        for i, client in enumerate(clients):
-            publisher = StoryPublisher(client)
-            
-            # Получаем группы для текущего аккаунта
-            account_groups = user_groups[i::len(clients)]
-            if not account_groups:
+        while True:
+            due = queue.next_due()
+            if due is None:
+                # Спим до ближайшего задания, но не дольше интервала проверки очереди
+                next_run_at = queue.next_run_at()
+                timeout = poll_interval if next_run_at is None else min(poll_interval, next_run_at - time.time())
+                await asyncio.sleep(max(0, timeout))
                 continue
             
-            logger.info(f"Публикация сторис с аккаунта {i+1} с {len(account_groups)} группами упоминаний")
-            
-            for group in account_groups:
-                # Выбираем случайный файл сторис
-                story_file = os.path.join(STORIES_DIR, random.choice(story_files))
-                
-                # Публикуем сторис
-                result = await publisher.publish_story_with_mentions(group, story_file)
-                
-                if result:
-                    total_published += 1
-                    logger.info(f"Опубликована сторис {total_published}/{len(account_groups)}")
-                else:
-                    logger.warning(f"Не удалось опубликовать сторис с аккаунта {i+1}")
-                
-                # Задержка между публикациями
-                await asyncio.sleep(DELAY_BETWEEN_STORIES)
-        
-        logger.info(f"Всего опубликовано {total_published} сторис")
+            job_id, job, resume = due
+            logger.info("Выполнение задания %s%s", job_id, " с контрольной точки" if resume else "")
+            queue.mark_running(job_id)
+            await account_manager.reconnect_clients()
+            try:
+                completed = await run_job(job, clients, checkpoints, resume=resume)
+            except Exception as e:
+                logger.error("Ошибка при выполнении задания %s: %s", job_id, e)
+                queue.mark_finished(job_id, False, str(e))
+            else:
+                queue.mark_finished(job_id, completed, None if completed else "Задание выполнено не полностью")
+                logger.info("Задание %s %s", job_id, "выполнено" if completed else "выполнено не полностью")
         
-    except KeyboardInterrupt:
-        logger.info("Работа программы прервана пользователем")
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("Работа планировщика прервана пользователем")
     except Exception as e:
-        logger.error(f"Ошибка при выполнении программы: {e}")
+        logger.error("Ошибка планировщика: %s", e)
     finally:
-        # Закрываем все клиенты
-        try:
-            await account_manager.close_all_clients()
-        except Exception as e:
-            logger.error(f"Ошибка при закрытии клиентов: {e}")
-        logger.info("Программа завершена")
+        if queue:
+            queue.close()
+        await shutdown(account_manager, checkpoints)
+
+def schedule_job(job, run_at):
+    """Добавление задания в очередь планировщика"""
+    ensure_directories()
+    queue = JobQueue()
+    run_at = parse_run_at(run_at)
+    job_id = queue.add(job, run_at)
+    logger.info("Задание %s добавлено в очередь, время запуска: %s", job_id,
+                datetime.datetime.fromtimestamp(run_at).isoformat(timespec='seconds'))
+    queue.close()
+
+def show_jobs(cancel=None):
+    """Вывод очереди заданий планировщика и отмена задания по номеру"""
+    ensure_directories()
+    queue = JobQueue()
+    if cancel is not None:
+        if queue.cancel(cancel):
+            logger.info("Задание %s отменено", cancel)
+        else:
+            logger.warning("Задание %s не найдено или уже выполняется", cancel)
+    for row in queue.list_jobs():
+        job = json.loads(row['job'])
+        logger.info(
+            "%s\t%s\t%s\t%s %s\t%s", row['id'],
+            datetime.datetime.fromtimestamp(row['run_at']).isoformat(timespec='seconds'),
+            row['status'], job['mode'], os.path.basename(job['input_file']), row['error'] or ''
+        )
+    queue.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    setup_logging()
+    if args.suppress or args.unsuppress:
+        try:
+            update_suppression(args)
+        except ValueError as e:
+            logger.error("Некорректная запись списка исключений: %s", e)
+            sys.exit(2)
+        sys.exit(0)
+    if args.list_jobs or args.cancel_job is not None:
+        show_jobs(cancel=args.cancel_job)
+        sys.exit(0)
+    if args.daemon:
+        run = daemon()
+    else:
+        try:
+            if args.schedule and not (args.job or args.mode):
+                raise ValueError("для --schedule задание указывается параметрами --job или --mode")
+            job = job_from_args(args)
+            if args.schedule:
+                schedule_job(job, args.schedule)
+                sys.exit(0)
+        except (OSError, ValueError) as e:
+            logger.error("Некорректное задание: %s", e)
+            sys.exit(2)
+        run = main(job, resume=args.resume)
+    try:
+        if args.profile:
+            from utils.profiler import profile_run
+            with profile_run(BASE_DIR, top=args.profile_top):
+                asyncio.run(run)
+        else:
+            asyncio.run(run)
+    except KeyboardInterrupt:
+        logger.info("Работа программы прервана пользователем, продолжить можно с параметром --resume")
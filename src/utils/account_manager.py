@@ -5,7 +5,7 @@ from telethon.sessions import StringSession
 import asyncio
 import os
 
-from configs.settings import ACCOUNTS_CONFIG, SESSIONS_DIR
+from configs.settings import ACCOUNTS_CONFIG, SESSIONS_DIR, FAKE_TELEGRAM, FAKE_ACCOUNTS
 
 logger = logging.getLogger(__name__)
 
@@ -19,18 +19,27 @@ class AccountManager:
     
     def _load_accounts(self):
         """Загрузка данных аккаунтов из конфигурационного файла"""
+        if FAKE_TELEGRAM and not os.path.exists(ACCOUNTS_CONFIG):
+            # В режиме имитации аккаунты можно не настраивать
+            self.accounts = [
+                {'phone': f"+1000000000{i}", 'api_id': 0, 'api_hash': ''}
+                for i in range(FAKE_ACCOUNTS)
+            ]
+            logger.info("Режим имитации Telegram: создано %s тестовых аккаунтов", len(self.accounts))
+            return
         try:
             with open(ACCOUNTS_CONFIG, 'r') as f:
                 config = json.load(f)
                 self.accounts = config.get('accounts', [])
-            logger.info(f"Загружено {len(self.accounts)} аккаунтов из конфигурации")
+            logger.info("Загружено %s аккаунтов из конфигурации", len(self.accounts))
         except Exception as e:
-            logger.error(f"Ошибка при загрузке аккаунтов: {e}")
+            logger.error("Ошибка при загрузке аккаунтов: %s", e)
             self.accounts = []
     
     async def setup_clients(self):
         """Настройка и авторизация клиентов Telegram"""
         self.clients = []
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
         
         for i, account in enumerate(self.accounts):
             try:
@@ -56,22 +65,27 @@ class AccountManager:
                         proxy['password'] = proxy_data['password']
                     
                     # Логируем настройки прокси для отладки
-                    logger.info(f"Настройки прокси: {proxy_type} {proxy_data['server']}:{proxy_data['port']}")
+                    logger.info("Настройки прокси: %s %s:%s", proxy_type, proxy_data['server'], proxy_data['port'])
                 
                 # Создание клиента
-                client = TelegramClient(
-                    session_file,
-                    api_id=account['api_id'],
-                    api_hash=account['api_hash'],
-                    proxy=proxy
-                )
+                if FAKE_TELEGRAM:
+                    # Офлайн-имитация Telegram API для бенчмарков
+                    from .fake_telegram import FakeTelegramClient
+                    client = FakeTelegramClient(session_file, account_index=i)
+                else:
+                    client = TelegramClient(
+                        session_file,
+                        api_id=account['api_id'],
+                        api_hash=account['api_hash'],
+                        proxy=proxy
+                    )
                 
                 # Подключение к Telegram
                 await client.connect()
                 
                 # Проверка авторизации и логин при необходимости
                 if not await client.is_user_authorized():
-                    logger.info(f"Аккаунт {i+1} не авторизован, отправка кода подтверждения")
+                    logger.info("Аккаунт %s не авторизован, отправка кода подтверждения", i+1)
                     await client.send_code_request(account['phone'])
                     
                     # Здесь должен быть запрос кода у пользователя
@@ -83,15 +97,15 @@ class AccountManager:
                         # Если включена двухфакторная аутентификация
                         if 'two_fa_password' in account and account['two_fa_password']:
                             password = account['two_fa_password']
-                            logger.info(f"Используем сохраненный пароль 2FA для аккаунта {account['phone']}")
+                            logger.info("Используем сохраненный пароль 2FA для аккаунта %s", account['phone'])
                         else:
                             password = input(f"Введите пароль двухфакторной аутентификации для аккаунта {account['phone']}: ")
                         await client.sign_in(password=password)
                     except Exception as auth_error:
-                        logger.error(f"Ошибка авторизации аккаунта {i+1}: {auth_error}")
+                        logger.error("Ошибка авторизации аккаунта %s: %s", i+1, auth_error)
                         continue
                     
-                    logger.info(f"Аккаунт {i+1} успешно авторизован")
+                    logger.info("Аккаунт %s успешно авторизован", i+1)
                 
                 # Добавление клиента в список
                 self.clients.append({
@@ -99,22 +113,43 @@ class AccountManager:
                     'account_info': account,
                     'index': i
                 })
-                logger.info(f"Клиент для аккаунта {i+1} успешно настроен")
+                logger.info("Клиент для аккаунта %s успешно настроен", i+1)
                 
             except Exception as e:
-                logger.error(f"Ошибка при настройке клиента для аккаунта {i+1}: {e}")
+                logger.error("Ошибка при настройке клиента для аккаунта %s: %s", i+1, e)
         
-        logger.info(f"Настроено {len(self.clients)} клиентов из {len(self.accounts)} аккаунтов")
+        logger.info("Настроено %s клиентов из %s аккаунтов", len(self.clients), len(self.accounts))
         return self.clients
     
+    async def reconnect_clients(self):
+        """
+        Повторное подключение клиентов, потерявших соединение (для долгой
+        работы планировщика). Сессия и авторизация при этом сохраняются.
+
+        Returns:
+            int: Количество переподключенных клиентов
+        """
+        reconnected = 0
+        for client_data in self.clients:
+            client = client_data['client']
+            if client.is_connected():
+                continue
+            try:
+                await client.connect()
+                reconnected += 1
+                logger.info("Клиент для аккаунта %s переподключен", client_data['index']+1)
+            except Exception as e:
+                logger.error("Ошибка при переподключении клиента %s: %s", client_data['index']+1, e)
+        return reconnected
+
     async def close_all_clients(self):
         """Закрытие всех клиентских сессий"""
         for client_data in self.clients:
             try:
                 await client_data['client'].disconnect()
-                logger.info(f"Клиент для аккаунта {client_data['index']+1} отключен")
+                logger.info("Клиент для аккаунта %s отключен", client_data['index']+1)
             except Exception as e:
-                logger.error(f"Ошибка при закрытии клиента {client_data['index']+1}: {e}")
+                logger.error("Ошибка при закрытии клиента %s: %s", client_data['index']+1, e)
     
     def get_client(self, index=0):
         """Получение клиента по индексу"""
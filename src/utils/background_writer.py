@@ -0,0 +1,111 @@
+import asyncio
+import concurrent.futures
+import csv
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write_csv(path, header, rows):
+    """
+    Запись строк в CSV через временный файл и атомарное переименование,
+    поэтому при сбое на диске остается либо старый, либо полностью записанный файл
+
+    Args:
+        path (str): Путь к CSV-файлу
+        header (tuple): Названия колонок
+        rows (iterable): Строки (кортежи значений в порядке колонок)
+    """
+    path = str(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BackgroundWriter:
+    """
+    Выполнение операций записи на диск в отдельном потоке
+
+    Все операции выполняются одним потоком в порядке поступления, поэтому
+    запись в одну базу или файл не перемешивается, а цикл событий asyncio
+    не ждет диска, пока выполняются сетевые запросы
+    """
+
+    def __init__(self):
+        self._executor = None
+
+    def _get_executor(self):
+        # Поток создается при первой записи
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='tg-stories-writer'
+            )
+        return self._executor
+
+    @staticmethod
+    def _log_error(future):
+        error = future.exception()
+        if error is not None:
+            logger.error("Ошибка фоновой записи: %s", error)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Постановка операции записи в очередь без ожидания
+
+        Ошибки операции записываются в лог
+
+        Returns:
+            concurrent.futures.Future: Результат операции
+        """
+        future = self._get_executor().submit(func, *args, **kwargs)
+        future.add_done_callback(self._log_error)
+        return future
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнение операции записи в потоке записи с ожиданием результата"""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def flush(self):
+        """Ожидание выполнения всех поставленных в очередь операций"""
+        if self._executor is not None:
+            self._executor.submit(lambda: None).result()
+
+    def close(self):
+        """Выполнение оставшихся операций и остановка потока записи"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+_shared_writer = None
+
+
+def get_shared_writer():
+    """
+    Возвращает общий для процесса поток записи
+
+    Returns:
+        BackgroundWriter: Общий поток записи
+    """
+    global _shared_writer
+    if _shared_writer is None:
+        _shared_writer = BackgroundWriter()
+    return _shared_writer
+
+
+def close_shared_writer():
+    """Выполнение оставшихся операций записи и остановка общего потока записи"""
+    global _shared_writer
+    if _shared_writer is not None:
+        try:
+            _shared_writer.close()
+        except Exception as e:
+            logger.error("Ошибка при остановке потока записи: %s", e)
+        _shared_writer = None
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from configs.settings import CHECKPOINT_DB
+from .sqlite_store import connect
+from .background_writer import get_shared_writer
+from .user_record import UserRecord
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    job TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lookups (
+    run_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    item TEXT NOT NULL,
+    result TEXT,
+    PRIMARY KEY (run_id, account, item)
+);
+CREATE TABLE IF NOT EXISTS publish_queue (
+    run_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    story_file TEXT NOT NULL,
+    users TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_publish_queue_account ON publish_queue(run_id, account, status);
+"""
+
+# Параметры задания, определяющие его идентификатор
+JOB_KEY_FIELDS = ('mode', 'input_file', 'story_files', 'story_selection', 'seed', 'users_per_story',
+                  'mention_cooldown', 'dry_run')
+
+
+def job_run_id(job):
+    """Идентификатор запуска: одинаковый для одинаковых заданий"""
+    key = json.dumps({field: job.get(field) for field in JOB_KEY_FIELDS}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+def _session_key(client):
+    """
+    Ключ сессии клиента, одинаковый во всех процессах
+
+    Returns:
+        str или None: Имя файла сессии без расширения, хэш строковой сессии или None
+    """
+    session = getattr(client, 'session', None)
+    filename = session if isinstance(session, str) else getattr(session, 'filename', None)
+    if filename:
+        return os.path.splitext(os.path.basename(str(filename)))[0]
+    save = getattr(session, 'save', None)
+    if callable(save):
+        saved = save()
+        if saved:
+            # Строка StringSession содержит ключ авторизации, поэтому хранится только ее хэш
+            return 'session_' + hashlib.sha256(saved.encode('utf-8')).hexdigest()[:16]
+    return None
+
+
+def account_key(client_data):
+    """
+    Ключ аккаунта в контрольной точке
+
+    Args:
+        client_data (dict или TelegramClient): Данные клиента из AccountManager или сам клиент
+
+    Returns:
+        str: Номер телефона аккаунта или, для клиента без данных аккаунта, имя его сессии
+    """
+    if isinstance(client_data, dict):
+        account = client_data.get('account_info') or {}
+        if account.get('phone'):
+            return str(account['phone'])
+        return str(client_data.get('index', 0))
+    key = _session_key(client_data)
+    if key is None:
+        # Без сессии устойчивого ключа нет: продолжить такой запуск с --resume не получится
+        logger.warning("У клиента нет сессии, контрольная точка действительна только в текущем процессе")
+        return str(id(client_data))
+    return key
+
+
+class LookupCheckpoint:
+    """Результаты проверки контактов одного аккаунта в рамках запуска"""
+
+    def __init__(self, store, run_id, account):
+        self.store = store
+        self.run_id = run_id
+        self.account = account
+        self.results = store.lookup_results(run_id, account)
+        self._unsaved = []
+
+    def record(self, item, result):
+        """Запоминает результат проверки (UserRecord или None - пользователь не найден); сохраняется в commit()"""
+        self.results[item] = result
+        self._unsaved.append((item, result))
+
+    def commit(self):
+        """Сохранение запомненных результатов проверки одной транзакцией в потоке записи"""
+        unsaved, self._unsaved = self._unsaved, []
+        if unsaved:
+            get_shared_writer().submit(self.store.record_lookups, self.run_id, self.account, unsaved)
+
+
+class CheckpointStore:
+    """
+    Контрольные точки запуска: результаты проверки контактов по аккаунтам и
+    очередь публикаций, чтобы прерванный запуск можно было продолжить без
+    повторных запросов к Telegram
+    """
+
+    def __init__(self, db_path=CHECKPOINT_DB):
+        self.db_path = str(db_path)
+        # Фиксация контрольной точки выполняется в потоке записи
+        self._lock = threading.RLock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+
+    def start_run(self, job, resume=False):
+        """
+        Начало или продолжение запуска задания
+
+        Args:
+            job (dict): Задание
+            resume (bool): Продолжить ранее прерванный запуск того же задания
+
+        Returns:
+            str: Идентификатор запуска
+        """
+        run_id = job_run_id(job)
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row and resume:
+                logger.info("Продолжение запуска %s (состояние: %s)", run_id, row['status'])
+                self.conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+                return run_id
+            if resume:
+                logger.info("Контрольная точка для задания не найдена, запуск %s начинается заново", run_id)
+            self.conn.execute("DELETE FROM lookups WHERE run_id = ?", (run_id,))
+            self.conn.execute("DELETE FROM publish_queue WHERE run_id = ?", (run_id,))
+            self.conn.execute(
+                "INSERT INTO runs (run_id, job, status, created_at, updated_at) VALUES (?, ?, 'lookup', ?, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET job = excluded.job, status = excluded.status, "
+                "created_at = excluded.created_at, updated_at = excluded.updated_at",
+                (run_id, json.dumps(job, ensure_ascii=False), now, now)
+            )
+        return run_id
+
+    def set_status(self, run_id, status):
+        """Состояние запуска: lookup, publishing или done"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?", (status, time.time(), run_id)
+            )
+
+    def lookup_checkpoint(self, run_id, account):
+        """
+        Контрольная точка проверки контактов одного аккаунта
+
+        Args:
+            run_id (str): Идентификатор запуска
+            account (str): Ключ аккаунта (account_key)
+
+        Returns:
+            LookupCheckpoint: Контрольная точка с ранее сохраненными результатами аккаунта
+        """
+        return LookupCheckpoint(self, run_id, account)
+
+    def lookup_results(self, run_id, account):
+        """Сохраненные результаты проверки контактов аккаунта: элемент -> UserRecord или None"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT item, result FROM lookups WHERE run_id = ? AND account = ?", (run_id, account)
+            ).fetchall()
+        return {
+            row['item']: UserRecord.from_dict(json.loads(row['result'])) if row['result'] else None
+            for row in rows
+        }
+
+    def record_lookups(self, run_id, account, results):
+        """
+        Запись результатов проверки одной транзакцией
+
+        Args:
+            run_id (str): Идентификатор запуска
+            account (str): Ключ аккаунта
+            results (list): Кортежи (элемент, UserRecord или None)
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO lookups (run_id, account, item, result) VALUES (?, ?, ?, ?)",
+                [
+                    (run_id, account, item, json.dumps(result.to_dict(), ensure_ascii=False) if result else None)
+                    for item, result in results
+                ]
+            )
+
+    def has_publish_queue(self, run_id):
+        """
+        Проверка наличия сохраненного плана публикаций
+
+        Args:
+            run_id (str): Идентификатор запуска
+
+        Returns:
+            bool: True, если план публикаций запуска уже создан
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM publish_queue WHERE run_id = ? LIMIT 1", (run_id,)).fetchone()
+        return row is not None
+
+    def create_publish_queue(self, run_id, items):
+        """
+        Сохранение плана публикаций
+
+        Args:
+            run_id (str): Идентификатор запуска
+            items (list): Кортежи (ключ аккаунта, файл сторис, список UserRecord для упоминания)
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO publish_queue (run_id, position, account, story_file, users, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, position, account, story_file,
+                     json.dumps([user.to_dict() for user in users], ensure_ascii=False), now)
+                    for position, (account, story_file, users) in enumerate(items)
+                ]
+            )
+            self.conn.execute(
+                "UPDATE runs SET status = 'publishing', updated_at = ? WHERE run_id = ?", (now, run_id)
+            )
+
+    def pending_publications(self, run_id, account=None):
+        """
+        Невыполненные публикации (ожидающие и завершившиеся ошибкой)
+
+        Args:
+            run_id (str): Идентификатор запуска
+            account (str, optional): Только публикации аккаунта
+
+        Returns:
+            list: Кортежи (позиция, ключ аккаунта, файл сторис, список UserRecord)
+        """
+        query = "SELECT position, account, story_file, users FROM publish_queue WHERE run_id = ? AND status != 'done'"
+        params = [run_id]
+        if account is not None:
+            query += " AND account = ?"
+            params.append(account)
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY position", params).fetchall()
+        return [
+            (row['position'], row['account'], row['story_file'],
+             [UserRecord.from_dict(user) for user in json.loads(row['users'])])
+            for row in rows
+        ]
+
+    def mark_published(self, run_id, position, success):
+        """Отметка результата публикации из очереди"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE publish_queue SET status = ?, updated_at = ? WHERE run_id = ? AND position = ?",
+                ('done' if success else 'failed', time.time(), run_id, position)
+            )
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
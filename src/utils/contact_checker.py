@@ -1,62 +1,197 @@
 import logging
-import csv
-import pandas as pd
 import os
-import json
 from telethon.tl.functions.contacts import ImportContactsRequest
 from telethon.tl.types import InputPhoneContact
-import asyncio
 import time
-from tqdm import tqdm
-from configs.settings import RESULTS_DIR
+from .user_cache import get_shared_cache
+from .user_record import UserRecord, USER_FIELDS, username_key, normalize_phone
+from .contact_reader import iter_usernames, iter_phones
+from .metrics import get_shared_metrics
+from .retry_policy import RetryPolicy, Pacer
+from .background_writer import get_shared_writer, atomic_write_csv
+from .suppression_list import get_shared_suppression
+from configs.settings import CHECKPOINT_INTERVAL, PHONE_CHECK_INTERVAL, USERNAME_CHECK_INTERVAL
 
 logger = logging.getLogger(__name__)
 
 class ContactChecker:
     """Класс для проверки наличия контактов в Telegram"""
     
-    def __init__(self, client_data):
+    def __init__(self, client_data, cache=None, checkpoint=None):
         # Если передан словарь с клиентом, извлекаем объект клиента
         if isinstance(client_data, dict) and 'client' in client_data:
             self.client = client_data['client']
         else:
             # Иначе предполагаем, что передан сам объект клиента
             self.client = client_data
+        # Найденные пользователи по ID (UserRecord.key)
         self.found_users = {}
-        self.cache_file = os.path.join(RESULTS_DIR, 'users_cache.json')
-        self.cached_users = self._load_cache()
+        # По умолчанию все проверяющие используют общий кэш процесса
+        self.cache = cache if cache is not None else get_shared_cache()
+        self.account_id = None
+        # Замеры длительности проверок
+        self.metrics = get_shared_metrics()
+        # Контрольная точка запуска (LookupCheckpoint): проверенные ранее контакты не проверяются повторно
+        self.checkpoint = checkpoint
+        self._unsaved_lookups = 0
+        # Повторы запросов при временных ошибках и FloodWait
+        self.retry = RetryPolicy()
+        # Запись на диск выполняется в отдельном потоке, чтобы не останавливать цикл событий
+        self.writer = get_shared_writer()
+        self._saved_keys = set()
+        # Пользователи, отказавшиеся от упоминаний, не проверяются и не попадают в результаты
+        self.suppression = get_shared_suppression()
     
-    def _load_cache(self):
-        """Загрузка кэша проверенных пользователей"""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    cache = json.load(f)
-                logger.info(f"Загружено {len(cache)} пользователей из кэша")
-                return cache
-            except Exception as e:
-                logger.error(f"Ошибка при загрузке кэша: {e}")
-        return {}
+    def _record_lookup(self, kind, result, started_at):
+        """
+        Учет одной проверки контакта в метриках
+        
+        Args:
+            kind (str): Тип проверки ('phone' или 'username')
+            result (str): Результат ('cache', 'found', 'not_found' или 'error')
+            started_at (float): Время начала проверки (time.perf_counter())
+        """
+        self.metrics.observe('contact_lookup_seconds', time.perf_counter() - started_at, kind=kind, result=result)
+        self.metrics.inc('contact_lookups_total', kind=kind, result=result)
     
-    def _save_cache(self):
-        """Сохранение кэша проверенных пользователей"""
+    def _suppressed(self, kind, user=None, key=None):
+        """
+        Проверка по списку исключений (без запросов к Telegram)
+        
+        Args:
+            kind (str): Тип проверки ('phone' или 'username')
+            user (UserRecord, optional): Найденный пользователь
+            key (str, optional): Нормализованный номер телефона или ключ юзернейма из файла
+        
+        Returns:
+            bool: True, если пользователя нельзя упоминать
+        """
+        if user is not None:
+            suppressed = self.suppression.has_user(user)
+        elif kind == 'phone':
+            suppressed = self.suppression.has_phone(key)
+        else:
+            suppressed = self.suppression.has_username(key)
+        if suppressed:
+            self.metrics.inc('contact_lookups_total', kind=kind, result='suppressed')
+        return suppressed
+    
+    async def _get_account_id(self):
+        """Получение ID аккаунта, от имени которого выполняется проверка"""
+        if self.account_id is None:
+            me = await self.client.get_me(input_peer=True)
+            self.account_id = me.user_id
+        return self.account_id
+    
+    async def _attach_access_hash(self, user, access_hash=None):
+        """
+        Добавляет к записи пользователя access_hash для текущего аккаунта,
+        чтобы при публикации не разрешать пользователя повторно
+        """
         try:
-            # Объединяем новых найденных пользователей с кэшем
-            merged_cache = {**self.cached_users, **self.found_users}
-            
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(merged_cache, f, ensure_ascii=False, indent=2)
-            logger.info(f"Сохранено {len(merged_cache)} пользователей в кэш")
+            account_id = await self._get_account_id()
+            if access_hash is None:
+                access_hash = self.cache.get_access_hash(account_id, user.user_id)
+            else:
+                self.cache.put_access_hash(account_id, user.user_id, access_hash)
+            if access_hash is not None:
+                user.access_hash = access_hash
+                user.account_id = account_id
         except Exception as e:
-            logger.error(f"Ошибка при сохранении кэша: {e}")
+            logger.warning("Не удалось сохранить access_hash пользователя %s: %s", user.user_id, e)
+        return user
+    
+    def _write_cache(self, users):
+        """Запись пользователей в кэш одной транзакцией (выполняется в потоке записи)"""
+        try:
+            self.cache.put_many(users)
+            self.cache.flush()
+            logger.info("Сохранено %s пользователей в кэш", len(users))
+        except Exception as e:
+            logger.error("Ошибка при сохранении кэша: %s", e)
+    
+    def _save_cache(self):
+        """Сохранение найденных пользователей в кэш (только новые с прошлого сохранения)"""
+        users = [user for key, user in self.found_users.items() if key not in self._saved_keys]
+        self._saved_keys.update(self.found_users)
+        if users:
+            self.writer.submit(self._write_cache, users)
+    
+    def _remember_found(self, user, fresh=False):
+        """
+        Добавление пользователя в найденные
+        
+        Args:
+            user (UserRecord): Найденный пользователь
+            fresh (bool): Пользователь получен запросом к Telegram. Пользователи из кэша и
+                контрольной точки уже есть в кэше и не перезаписываются: иначе время их
+                обновления сдвигалось бы при каждом запуске и запись не устаревала бы по TTL
+        """
+        self.found_users[user.key] = user
+        if not fresh:
+            self._saved_keys.add(user.key)
+    
+    def _checkpoint_lookup(self, item, result):
+        """
+        Запоминает результат проверки в контрольной точке и периодически
+        сохраняет кэш и контрольную точку, чтобы не потерять их при сбое
+        """
+        if self.checkpoint is None:
+            return
+        self.checkpoint.record(item, result)
+        self._unsaved_lookups += 1
+        if self._unsaved_lookups >= CHECKPOINT_INTERVAL:
+            self._save_checkpoint()
+    
+    def _save_checkpoint(self):
+        """Сохранение кэша пользователей и контрольной точки проверки"""
+        self._save_cache()
+        if self.checkpoint is not None:
+            self.checkpoint.commit()
+        self._unsaved_lookups = 0
+    
+    def _restored_lookup(self, item):
+        """
+        Результат проверки из контрольной точки прерванного запуска
+        
+        Returns:
+            tuple: (есть ли результат, данные пользователя или None)
+        """
+        if self.checkpoint is None or item not in self.checkpoint.results:
+            return False, None
+        return True, self.checkpoint.results[item]
     
     async def check_phone_number(self, phone_number):
         """Проверяет наличие пользователя в Telegram по номеру телефона"""
+        try:
+            return await self._check_phone(phone_number)
+        except Exception as e:
+            logger.error("Ошибка при проверке номера %s: %s", phone_number, e)
+            return None
+    
+    async def _check_phone(self, phone_number):
+        """
+        Проверка номера телефона с передачей ошибок вызывающему
+        
+        Returns:
+            UserRecord или None: Найденный пользователь или None, если номера нет в Telegram
+        
+        Raises:
+            Exception: Ошибка запроса (после всех повторов) - результат проверки неизвестен
+        """
+        started_at = time.perf_counter()
         try:
             # Нормализация номера телефона
-            phone = phone_number.strip()
-            if not phone.startswith('+'):
-                phone = '+' + phone
+            phone = normalize_phone(phone_number)
+            
+            # Проверяем, есть ли пользователь в кэше
+            cached_user = self.cache.get_by_phone(phone)
+            if cached_user:
+                logger.debug("Пользователь с номером %s найден в кэше: %s", phone, cached_user.user_id)
+                await self._attach_access_hash(cached_user)
+                self._remember_found(cached_user)
+                self._record_lookup('phone', 'cache', started_at)
+                return cached_user
             
             # Создание контакта для импорта
             contact = InputPhoneContact(
@@ -67,76 +202,103 @@ class ContactChecker:
             )
             
             # Импорт контакта
-            result = await self.client(ImportContactsRequest([contact]))
-            
-            # Проверка результата
-            if result.users:
-                user = result.users[0]
-                user_data = {
-                    'user_id': user.id,
-                    'username': user.username,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'phone': phone
-                }
-                self.found_users[phone] = user_data
-                return user_data
-            else:
-                logger.info(f"Пользователь с номером {phone} не найден в Telegram")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Ошибка при проверке номера {phone_number}: {e}")
-            return None
+            result = await self.retry.call('import_contacts', self.client, ImportContactsRequest([contact]))
+        except Exception:
+            self._record_lookup('phone', 'error', started_at)
+            raise
+        
+        # Проверка результата
+        if result.users:
+            user = result.users[0]
+            user_data = UserRecord.from_entity(user, phone=phone)
+            await self._attach_access_hash(user_data, user.access_hash)
+            # В кэш пользователь записывается потоком записи при сохранении контрольной точки
+            self._remember_found(user_data, fresh=True)
+            self._record_lookup('phone', 'found', started_at)
+            return user_data
+        logger.info("Пользователь с номером %s не найден в Telegram", phone)
+        self._record_lookup('phone', 'not_found', started_at)
+        return None
     
     async def process_contacts_file(self, file_path, output_path=None):
         """Обработка файла с контактами"""
         try:
-            # Чтение контактов из файла
-            contacts = []
-            with open(file_path, 'r', encoding='utf-8') as file:
-                csv_reader = csv.reader(file)
-                header = next(csv_reader, None)  # Пропускаем заголовок если есть
-                
-                for row in csv_reader:
-                    if row and len(row) > 0:
-                        contacts.append(row[0])  # Предполагаем, что номер телефона в первом столбце
-            
-            logger.info(f"Загружено {len(contacts)} контактов из файла {file_path}")
-            
-            # Проверка контактов
+            # Контакты читаются из файла потоково: проверка начинается с первой строки
+            from tqdm import tqdm
             results = []
-            for phone in tqdm(contacts, desc="Проверка контактов"):
-                result = await self.check_phone_number(phone)
+            checked = 0
+            restored = 0
+            suppressed = 0
+            failed = 0
+            # Интервал между запросами, чтобы не упираться в ограничения API
+            pacer = Pacer(PHONE_CHECK_INTERVAL)
+            for phone in tqdm(iter_phones(file_path), desc="Проверка контактов", unit="contact"):
+                checked += 1
+                # Номер в списке исключений не проверяется
+                if self._suppressed('phone', key=phone):
+                    suppressed += 1
+                    continue
+                
+                # Контакт уже проверен в прерванном запуске
+                is_restored, result = self._restored_lookup(phone)
+                if is_restored:
+                    restored += 1
+                    if result and not self._suppressed('phone', result):
+                        self._remember_found(result)
+                        results.append(result)
+                    continue
+                
+                await pacer.wait()
+                try:
+                    result = await self._check_phone(phone)
+                except Exception as e:
+                    # Результат неизвестен: в контрольную точку не попадает и проверяется повторно при --resume
+                    logger.error("Ошибка при проверке номера %s: %s", phone, e)
+                    failed += 1
+                    continue
+                if result and self._suppressed('phone', result):
+                    suppressed += 1
+                    result = None
                 if result:
                     results.append(result)
-                # Пауза для избежания ограничений API
-                await asyncio.sleep(0.5)
+                self._checkpoint_lookup(phone, result)
             
+            logger.info("Проверено %s контактов из файла %s, найдено %s", checked, file_path, len(results))
+            if restored:
+                logger.info("Результаты %s контактов восстановлены из контрольной точки", restored)
+            if suppressed:
+                logger.info("Пропущено %s контактов из списка исключений", suppressed)
+            if failed:
+                logger.warning("Не удалось проверить %s контактов, они будут проверены повторно при --resume", failed)
+
+            # Сохраняем обновленный кэш и контрольную точку
+            self._save_checkpoint()
+
             # Сохранение результатов
             if output_path:
-                df = pd.DataFrame(results)
-                df.to_csv(output_path, index=False)
-                logger.info(f"Результаты сохранены в {output_path}")
+                rows = [user.csv_row() for user in results]
+                await self.writer.run(atomic_write_csv, output_path, USER_FIELDS, rows)
+                logger.info("Результаты сохранены в %s", output_path)
             
             return results
             
         except Exception as e:
-            logger.error(f"Ошибка при обработке файла контактов: {e}")
+            logger.error("Ошибка при обработке файла контактов: %s", e)
             return []
     
     async def cleanup_contacts(self):
         """Удаление добавленных контактов"""
         try:
             if self.found_users:
-                user_ids = [user_data['user_id'] for user_data in self.found_users.values()]
+                user_ids = list(self.found_users)
                 if user_ids:
                     from telethon.tl.functions.contacts import DeleteContactsRequest
-                    await self.client(DeleteContactsRequest(id=user_ids))
-                    logger.info(f"Удалено {len(user_ids)} временных контактов")
+                    await self.retry.call('delete_contacts', self.client, DeleteContactsRequest(id=user_ids))
+                    logger.info("Удалено %s временных контактов", len(user_ids))
                 self.found_users = {}
+                self._saved_keys = set()
         except Exception as e:
-            logger.error(f"Ошибка при очистке контактов: {e}")
+            logger.error("Ошибка при очистке контактов: %s", e)
     
     def get_found_users(self):
         """Возвращает найденных пользователей"""
@@ -153,34 +315,39 @@ class ContactChecker:
             Entity или None: Сущность пользователя или None, если пользователь не найден
         """
         try:
-            # Проверяем, что клиент корректный
-            if not self.client:
-                logger.error(f"Отсутствует клиент для поиска пользователя {username}")
-                return None
-                
-            # Удаляем @ если он есть в начале, чтобы избежать двойного @
-            if username.startswith('@'):
-                username = username[1:]
-                
-            # Используем get_entity для поиска пользователя по юзернейму
-            try:
-                entity = await self.client.get_entity(username)
-                logger.info(f"Найден пользователь @{username}: {entity.id}")
-                return entity
-            except ValueError:
-                # Пробуем поискать с @
-                try:
-                    entity = await self.client.get_entity(f"@{username}")
-                    logger.info(f"Найден пользователь @{username}: {entity.id}")
-                    return entity
-                except Exception as e:
-                    logger.error(f"Пользователь @{username} не найден: {e}")
-                    return None
-                
+            return await self._find_user(username)
         except Exception as e:
-            logger.error(f"Ошибка при поиске пользователя {username}: {e}")
+            logger.error("Ошибка при поиске пользователя %s: %s", username, e)
             return None
     
+    async def _find_user(self, username):
+        """
+        Поиск пользователя по юзернейму с передачей ошибок вызывающему
+        
+        Returns:
+            Entity или None: Сущность пользователя или None, если пользователя нет
+        
+        Raises:
+            Exception: Ошибка запроса (после всех повторов) - результат проверки неизвестен
+        """
+        # Проверяем, что клиент корректный
+        if not self.client:
+            raise RuntimeError("Отсутствует клиент для поиска пользователя")
+            
+        # Удаляем @ если он есть в начале, чтобы избежать двойного @
+        if username.startswith('@'):
+            username = username[1:]
+            
+        # Используем get_entity для поиска пользователя по юзернейму
+        # (ValueError означает, что пользователя нет - такой запрос не повторяется)
+        try:
+            entity = await self.retry.call('get_entity', self.client.get_entity, username)
+        except ValueError as e:
+            logger.error("Пользователь @%s не найден: %s", username, e)
+            return None
+        logger.info("Найден пользователь @%s: %s", username, entity.id)
+        return entity
+    
     async def check_usernames_from_file(self, filepath):
         """
         Проверка существования пользователей по юзернейму из файла
@@ -192,76 +359,106 @@ class ContactChecker:
             list: Список найденных пользователей
         """
         if not os.path.exists(filepath):
-            logger.error(f"Файл {filepath} не найден")
+            logger.error("Файл %s не найден", filepath)
             return []
         
         try:
+            from tqdm import tqdm
             found_users = []
-            
-            # Загружаем юзернеймы из CSV файла
-            df = pd.read_csv(filepath)
-            if 'username' not in df.columns:
-                logger.error(f"В файле {filepath} отсутствует колонка 'username'")
-                return []
-                
-            # Предварительно отфильтровываем пользователей, которые уже есть в кэше
-            new_usernames = []
             cached_found = []
+            checked = 0
+            restored = 0
+            suppressed = 0
+            failed = 0
+            # Интервал между запросами, чтобы не перегружать API
+            pacer = Pacer(USERNAME_CHECK_INTERVAL)
             
-            for _, row in df.iterrows():
-                username = row['username'].strip()
-                if not username:
+            # Юзернеймы читаются из файла потоково (без повторов): пользователи из кэша
+            # берутся сразу, остальные проверяются по мере чтения файла
+            for username in tqdm(iter_usernames(filepath), desc="Проверка юзернеймов", unit="user"):
+                cache_key = username_key(username)
+                started_at = time.perf_counter()
+                
+                # Юзернейм из списка исключений не проверяется
+                if self._suppressed('username', key=cache_key):
+                    suppressed += 1
+                    continue
+                
+                # Юзернейм уже проверен в прерванном запуске
+                is_restored, user_data = self._restored_lookup(cache_key)
+                if is_restored:
+                    restored += 1
+                    if user_data and not self._suppressed('username', user_data):
+                        cached_found.append(user_data)
+                        self._remember_found(user_data)
                     continue
                 
                 # Проверяем, есть ли пользователь в кэше
-                cache_key = username.lower().replace('@', '')
-                if cache_key in self.cached_users:
-                    cached_user = self.cached_users[cache_key]
+                cached_user = self.cache.get_by_username(username)
+                if cached_user and self._suppressed('username', cached_user):
+                    suppressed += 1
+                    continue
+                if cached_user:
+                    await self._attach_access_hash(cached_user)
                     cached_found.append(cached_user)
-                    logger.info(f"Пользователь @{username} найден в кэше: {cached_user.get('user_id')}")
-                else:
-                    new_usernames.append(username)
-            
-            if not new_usernames:
-                logger.info(f"Все {len(cached_found)} пользователей уже были проверены ранее")
-                # Добавляем найденных из кэша пользователей в общий список
-                for user_data in cached_found:
-                    self.found_users[user_data['username'].lower().replace('@', '')] = user_data
-                return cached_found
+                    self._remember_found(cached_user)
+                    logger.debug("Пользователь @%s найден в кэше: %s", username, cached_user.user_id)
+                    self._record_lookup('username', 'cache', started_at)
+                    self._checkpoint_lookup(cache_key, cached_user)
+                    continue
                 
-            logger.info(f"Загружено {len(new_usernames)} новых юзернеймов для проверки")
-            
-            # Создаём tqdm прогресс-бар для отслеживания прогресса
-            for username in tqdm(new_usernames, desc="Проверка юзернеймов", unit="user"):
                 # Получаем информацию о пользователе
-                user = await self.get_user_by_username(username)
+                checked += 1
+                await pacer.wait()
+                # Ожидание интервала между запросами не входит в длительность проверки
+                started_at = time.perf_counter()
+                try:
+                    user = await self._find_user(username)
+                except Exception as e:
+                    # Результат неизвестен: в контрольную точку не попадает и проверяется повторно при --resume
+                    logger.error("Ошибка при поиске пользователя %s: %s", username, e)
+                    self._record_lookup('username', 'error', started_at)
+                    failed += 1
+                    continue
+                user_data = None
                 if user:
                     # Сохраняем найденного пользователя
-                    user_data = {
-                        'user_id': user.id,
-                        'username': username,
-                        'first_name': getattr(user, 'first_name', ''),
-                        'last_name': getattr(user, 'last_name', '')
-                    }
+                    user_data = UserRecord.from_entity(user, username=username)
+                if user_data and self._suppressed('username', user_data):
+                    # Пользователь исключен по ID: в результаты не попадает
+                    suppressed += 1
+                    user_data = None
+                elif user_data:
+                    await self._attach_access_hash(user_data, getattr(user, 'access_hash', None))
                     found_users.append(user_data)
                     
                     # Добавляем в общий словарь найденных пользователей
-                    cache_key = username.lower().replace('@', '')
-                    self.found_users[cache_key] = user_data
-                    
-                # Небольшая задержка, чтобы не перегружать API
-                await asyncio.sleep(1)
+                    self._remember_found(user_data, fresh=True)
+                self._record_lookup('username', 'found' if user else 'not_found', started_at)
+                self._checkpoint_lookup(cache_key, user_data)
+            
+            if restored:
+                logger.info("Результаты %s юзернеймов восстановлены из контрольной точки", restored)
+            if suppressed:
+                logger.info("Пропущено %s юзернеймов из списка исключений", suppressed)
+            if failed:
+                logger.warning("Не удалось проверить %s юзернеймов, они будут проверены повторно при --resume", failed)
+            if not checked:
+                logger.info("Все %s пользователей уже были проверены ранее", len(cached_found))
             
             # Объединяем результаты с кэшем
             all_found = found_users + cached_found
-            logger.info(f"Найдено {len(found_users)} новых пользователей из {len(new_usernames)}")
-            logger.info(f"Всего найдено {len(all_found)} пользователей (включая кэшированных)")
+            logger.info("Найдено %s новых пользователей из %s", len(found_users), checked)
+            logger.info("Всего найдено %s пользователей (включая кэшированных)", len(all_found))
             
-            # Сохраняем обновленный кэш
-            self._save_cache()
+            # Сохраняем обновленный кэш и контрольную точку
+            self._save_checkpoint()
             
             return all_found
             
+        except ValueError as e:
+            logger.error("Некорректный файл с юзернеймами %s: %s", filepath, e)
+            return []
         except Exception as e:
-            logger.error(f"Ошибка при обработке файла с юзернеймами: {e}")
+            logger.error("Ошибка при обработке файла с юзернеймами: %s", e)
             return []
@@ -0,0 +1,69 @@
+import csv
+import logging
+
+from .user_record import username_key, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+
+def _clean_username(value):
+    """Юзернейм без пробелов и символа @ в начале"""
+    return value.strip().lstrip('@')
+
+
+def iter_column(file_path, column=None, normalize=None, key=None):
+    """
+    Потоковое чтение значений одной колонки CSV-файла без загрузки файла в память
+
+    Пустые значения пропускаются, повторы (по ключу key) отбрасываются
+
+    Args:
+        file_path (str): Путь к CSV-файлу с заголовком
+        column (str, optional): Имя колонки. Если не указано, берется первая колонка
+        normalize (callable, optional): Нормализация значения перед выдачей
+        key (callable, optional): Ключ для поиска повторов (по умолчанию само значение)
+
+    Yields:
+        str: Нормализованные уникальные значения
+
+    Raises:
+        ValueError: Если в файле нет указанной колонки
+    """
+    seen = set()
+    with open(file_path, 'r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        index = 0
+        if column is not None:
+            header = [name.strip() for name in header]
+            if column not in header:
+                raise ValueError(f"В файле {file_path} отсутствует колонка '{column}'")
+            index = header.index(column)
+
+        for row in reader:
+            if len(row) <= index:
+                continue
+            value = row[index].strip()
+            if not value:
+                continue
+            if normalize:
+                value = normalize(value)
+                if not value:
+                    continue
+            dedup_key = key(value) if key else value
+            if dedup_key in seen:
+                continue
+            seen.add(dedup_key)
+            yield value
+
+
+def iter_usernames(file_path):
+    """Потоковое чтение уникальных юзернеймов из колонки 'username'"""
+    return iter_column(file_path, 'username', normalize=_clean_username, key=username_key)
+
+
+def iter_phones(file_path):
+    """Потоковое чтение уникальных номеров телефонов из первой колонки"""
+    return iter_column(file_path, normalize=normalize_phone)
@@ -0,0 +1,96 @@
+import base64
+import collections
+import datetime
+import json
+import math
+import os
+
+from telethon import types
+
+# Размер части при загрузке файла и порог "больших" файлов (как в Telethon)
+UPLOAD_PART_SIZE = 512 * 1024
+BIG_FILE_SIZE = 10 * 1024 * 1024
+
+
+def placeholder_file(path):
+    """
+    Заглушка загруженного файла для пробного запуска: те же имя и количество
+    частей, что и при настоящей загрузке, но без обращения к серверу
+
+    Args:
+        path (str): Путь к файлу
+
+    Returns:
+        InputFile или InputFileBig: Объект файла для запроса
+    """
+    size = os.path.getsize(path)
+    parts = max(1, math.ceil(size / UPLOAD_PART_SIZE))
+    name = os.path.basename(path)
+    if size > BIG_FILE_SIZE:
+        return types.InputFileBig(id=0, parts=parts, name=name)
+    return types.InputFile(id=0, parts=parts, name=name, md5_checksum='')
+
+
+def _json_default(value):
+    """Значения TL-объектов, которые не сериализуются в JSON напрямую"""
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def serialize_request(request, **fields):
+    """
+    Строка JSON с запросом и сведениями о публикации
+
+    Запрос сериализуется и в двоичный формат Telegram: это проверяет типы
+    всех полей и дает размер запроса
+
+    Args:
+        request (TLRequest): Запрос (например, SendStoryRequest)
+        **fields: Дополнительные поля записи
+
+    Returns:
+        str: Запись в формате JSON Lines
+    """
+    entry = dict(fields)
+    entry['payload_bytes'] = len(bytes(request))
+    entry['request'] = request.to_dict()
+    return json.dumps(entry, ensure_ascii=False, default=_json_default)
+
+
+def append_lines(path, lines):
+    """Дозапись строк в файл (выполняется в потоке записи)"""
+    with open(path, 'a', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+
+
+def write_report(path, plan, summary):
+    """
+    Отчет о пробном запуске: разбиение упоминаний по аккаунтам и сторис и
+    сводка по времени этапов
+
+    Args:
+        path (str): Путь к файлу отчета
+        plan (list): Публикации плана: кортежи (позиция, ключ аккаунта, файл сторис, пользователи)
+        summary (str): Сводка метрик (MetricsRegistry.summary())
+
+    Returns:
+        str: Текст отчета
+    """
+    by_account = collections.defaultdict(list)
+    for _, account, _, users in plan:
+        by_account[account].append(len(users))
+    lines = [
+        f"Пробный запуск: {len(plan)} сторис, {sum(len(users) for *_, users in plan)} упоминаний",
+    ]
+    for account, sizes in by_account.items():
+        lines.append(f"  Аккаунт {account}: {len(sizes)} сторис, упоминаний в сторис: {sizes}")
+    lines.append(summary)
+    report = "\n".join(lines)
+    os.makedirs(os.path.dirname(str(path)) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(report + "\n")
+    return report
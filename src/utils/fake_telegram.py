@@ -0,0 +1,208 @@
+import asyncio
+import collections
+import datetime
+import logging
+import os
+import random
+import zlib
+
+from telethon import errors, functions, types
+
+from configs.settings import (
+    FAKE_LATENCY, FAKE_UPLOAD_SPEED, FAKE_ERROR_RATE, FAKE_FOUND_RATE
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _stable_id(value):
+    """Детерминированный ID пользователя по юзернейму или номеру телефона"""
+    return 100000000 + zlib.crc32(str(value).lower().encode('utf-8')) % 900000000
+
+
+class FakeTelegramClient:
+    """
+    Офлайн-имитация TelegramClient для бенчмарков и проверки без сети
+
+    Реализует только вызовы, используемые AccountManager, ContactChecker и StoryPublisher:
+    connect, is_user_authorized, get_me, upload_file, get_entity, get_input_entity и
+    запросы GetFullUserRequest, SendStoryRequest, ImportContactsRequest, DeleteContactsRequest.
+    Задержка каждого вызова и доля ошибок настраиваются.
+    """
+
+    def __init__(self, session=None, api_id=None, api_hash=None, proxy=None, account_index=0,
+                 latency=FAKE_LATENCY, upload_speed=FAKE_UPLOAD_SPEED, error_rate=FAKE_ERROR_RATE,
+                 found_rate=FAKE_FOUND_RATE, errors_to_inject=None, seed=None):
+        # Имя сессии по умолчанию зависит от аккаунта, как файл сессии в AccountManager
+        self.session = session or f"fake_account_{account_index}"
+        self.latency = latency
+        self.upload_speed = upload_speed
+        self.error_rate = error_rate
+        self.found_rate = found_rate
+        # Ошибки для имитации: фабрики исключений, выбираемые случайно
+        self.errors_to_inject = errors_to_inject or [
+            lambda request: errors.FloodWaitError(request=request, capture=1),
+            lambda request: errors.RPCError(request=request, message='INTERNAL_SERVER_ERROR', code=500),
+        ]
+        self.random = random.Random(seed)
+        self.connected = False
+        self.me = types.User(
+            id=_stable_id(f"account_{account_index}"),
+            access_hash=account_index + 1,
+            username=f"fake_account_{account_index}",
+            first_name="Fake",
+            premium=True
+        )
+        self.stats = collections.Counter()
+        self._next_id = 1
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    async def _simulate(self, method, request=None, extra_delay=0.0):
+        """Имитация сетевой задержки и случайной ошибки"""
+        self.stats[method] += 1
+        delay = self.random.uniform(0.5, 1.5) * self.latency + extra_delay
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats[f"{method}:error"] += 1
+            raise self.random.choice(self.errors_to_inject)(request)
+
+    def _user(self, key):
+        """Пользователь для юзернейма или телефона, если он «существует» в имитации"""
+        user_id = _stable_id(key)
+        if (user_id % 1000) / 1000 >= self.found_rate:
+            return None
+        key = str(key)
+        is_phone = key.startswith('+')
+        return types.User(
+            id=user_id,
+            access_hash=user_id * 7 + self.me.id,
+            username=None if is_phone else key.lstrip('@'),
+            first_name=f"User{user_id % 10000}",
+            phone=key.lstrip('+') if is_phone else None
+        )
+
+    async def connect(self):
+        await self._simulate('connect')
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    def is_connected(self):
+        return self.connected
+
+    async def is_user_authorized(self):
+        return True
+
+    async def send_code_request(self, phone):
+        await self._simulate('send_code_request')
+
+    async def sign_in(self, *args, **kwargs):
+        await self._simulate('sign_in')
+        return self.me
+
+    async def get_me(self, input_peer=False):
+        if input_peer:
+            return types.InputPeerUser(user_id=self.me.id, access_hash=self.me.access_hash)
+        await self._simulate('get_me')
+        return self.me
+
+    async def upload_file(self, file, **kwargs):
+        size = os.path.getsize(file)
+        await self._simulate('upload_file', extra_delay=size / self.upload_speed if self.upload_speed else 0)
+        self.stats['upload_bytes'] += size
+        return types.InputFile(
+            id=self._new_id(),
+            parts=max(1, size // (512 * 1024)),
+            name=os.path.basename(file),
+            md5_checksum=''
+        )
+
+    async def get_entity(self, entity):
+        await self._simulate('get_entity')
+        if isinstance(entity, types.User):
+            return entity
+        if isinstance(entity, int):
+            return types.User(id=entity, access_hash=entity * 7 + self.me.id, username=None)
+        user = self._user(str(entity).lstrip('@'))
+        if not user:
+            raise ValueError(f'No user has "{entity}" as username')
+        return user
+
+    async def get_input_entity(self, entity):
+        if isinstance(entity, (types.InputPeerUser, types.InputPeerSelf)):
+            return entity
+        if not isinstance(entity, types.User):
+            entity = await self.get_entity(entity)
+        return types.InputPeerUser(user_id=entity.id, access_hash=entity.access_hash)
+
+    async def __call__(self, request):
+        method = type(request).__name__
+        await self._simulate(method, request)
+
+        if isinstance(request, functions.users.GetFullUserRequest):
+            return types.users.UserFull(
+                full_user=types.UserFull(
+                    id=self.me.id,
+                    settings=types.PeerSettings(),
+                    notify_settings=types.PeerNotifySettings(),
+                    common_chats_count=0
+                ),
+                chats=[],
+                users=[self.me]
+            )
+
+        if isinstance(request, functions.contacts.ImportContactsRequest):
+            users = [user for user in (self._user(contact.phone) for contact in request.contacts) if user]
+            return types.contacts.ImportedContacts(
+                imported=[types.ImportedContact(user_id=user.id, client_id=0) for user in users],
+                popular_invites=[],
+                retry_contacts=[],
+                users=users
+            )
+
+        if isinstance(request, functions.contacts.DeleteContactsRequest):
+            return types.Updates(updates=[], users=[], chats=[], date=datetime.datetime.now(), seq=0)
+
+        if isinstance(request, functions.stories.SendStoryRequest):
+            return self._story_updates(request)
+
+        # Неподдерживаемый запрос - такая же ошибка 400, как у Telegram для неизвестного метода:
+        # RetryPolicy не повторяет его, а Telethon указывает в сообщении класс запроса
+        raise errors.BadRequestError(request=request, message='METHOD_INVALID')
+
+    def _story_updates(self, request):
+        """Ответ на SendStoryRequest с опубликованной сторис"""
+        now = datetime.datetime.now()
+        media = request.media
+        if isinstance(media, (types.InputMediaUploadedPhoto, types.InputMediaPhoto)):
+            photo_id = media.id.id if isinstance(media, types.InputMediaPhoto) else self._new_id()
+            story_media = types.MessageMediaPhoto(photo=types.Photo(
+                id=photo_id, access_hash=photo_id, file_reference=b'fake', date=now, sizes=[], dc_id=2
+            ))
+        else:
+            document_id = media.id.id if isinstance(media, types.InputMediaDocument) else self._new_id()
+            story_media = types.MessageMediaDocument(document=types.Document(
+                id=document_id, access_hash=document_id, file_reference=b'fake', date=now,
+                mime_type=getattr(media, 'mime_type', 'video/mp4'), size=0, dc_id=2,
+                attributes=getattr(media, 'attributes', [])
+            ))
+        story = types.StoryItem(
+            id=self._new_id(),
+            date=now,
+            expire_date=now + datetime.timedelta(seconds=request.period or 86400),
+            media=story_media,
+            caption=request.caption,
+            entities=request.entities
+        )
+        return types.Updates(
+            updates=[types.UpdateStory(peer=types.PeerUser(self.me.id), story=story)],
+            users=[],
+            chats=[],
+            date=now,
+            seq=0
+        )
@@ -0,0 +1,450 @@
+import datetime
+import glob
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from configs.settings import (
+    HISTORY_DB, LEGACY_HISTORY_FILE, HISTORY_HOT_DAYS, HISTORY_MAX_HOT_ROWS, MENTION_COOLDOWN
+)
+from .sqlite_store import connect, get_meta, set_meta
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS publications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    story_file TEXT,
+    success INTEGER NOT NULL,
+    error TEXT,
+    users_mentioned TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mentions (
+    publication_id INTEGER NOT NULL,
+    username TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT NOT NULL,
+    story_file TEXT NOT NULL,
+    published INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    mentions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, story_file)
+);
+CREATE INDEX IF NOT EXISTS idx_publications_date ON publications(date);
+CREATE INDEX IF NOT EXISTS idx_publications_story_file ON publications(story_file, date);
+CREATE INDEX IF NOT EXISTS idx_publications_success ON publications(success, date);
+CREATE INDEX IF NOT EXISTS idx_mentions_username ON mentions(username, publication_id);
+CREATE INDEX IF NOT EXISTS idx_mentions_publication ON mentions(publication_id);
+"""
+
+
+# Формат даты записей истории
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Общие экземпляры истории на процесс (по пути к базе)
+_shared_histories = {}
+
+# Имя сегмента архива: <имя базы>_<первый id>-<последний id>.jsonl.gz
+SEGMENT_PATTERN = re.compile(r'_(\d+)-(\d+)\.jsonl\.gz$')
+
+
+def mention_key(user):
+    """Нормализованный ключ упомянутого пользователя для индекса"""
+    return str(user).lower().replace('@', '')
+
+
+class HistoryStore:
+    """Хранилище истории публикаций сторис с дозаписью и индексами"""
+
+    def __init__(self, db_path=HISTORY_DB, legacy_file=LEGACY_HISTORY_FILE, archive_dir=None,
+                 hot_days=HISTORY_HOT_DAYS, max_hot_rows=HISTORY_MAX_HOT_ROWS, keep_seconds=MENTION_COOLDOWN):
+        self.db_path = str(db_path)
+        self.legacy_file = str(legacy_file) if legacy_file else None
+        # Сжатые сегменты старых записей хранятся рядом с базой
+        self.archive_dir = str(archive_dir or os.path.join(os.path.dirname(self.db_path), 'archive'))
+        self.hot_days = hot_days
+        self.max_hot_rows = max_hot_rows
+        # Записи за последние keep_seconds секунд не переносятся в архив: индекс упоминаний
+        # читает архив только для интервалов между упоминаниями длиннее этого
+        self.keep_seconds = keep_seconds
+        # Дозапись может выполняться в потоке записи, а выборки - в цикле событий
+        self._lock = threading.RLock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+        self._migrate_legacy()
+        self._build_daily_counts()
+        try:
+            self.rotate()
+        except (OSError, sqlite3.Error) as e:
+            # История остается в базе целиком, ротация повторится при следующем открытии
+            logger.warning("Ошибка ротации истории %s: %s", self.db_path, e)
+
+    def _migrate_legacy(self):
+        """Однократный перенос записей из старого файла publishing_history.json"""
+        if get_meta(self.conn, 'legacy_migrated'):
+            return
+        history = []
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            try:
+                with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                    history = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                # Не помечаем миграцию выполненной, чтобы повторить её после исправления файла
+                logger.warning("Ошибка чтения файла истории %s: %s", self.legacy_file, e)
+                return
+        with self.conn:
+            for entry in history:
+                self._insert(entry)
+            set_meta(self.conn, 'legacy_migrated', len(history))
+        if history:
+            logger.info("Перенесено %s записей истории из %s", len(history), self.legacy_file)
+
+    def _build_daily_counts(self):
+        """Однократное построение сводки по дням для записей, добавленных до ее появления"""
+        if get_meta(self.conn, 'daily_counts_built'):
+            return
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM daily_counts")
+            self.conn.execute(
+                "INSERT INTO daily_counts (day, story_file, published, failed, mentions) "
+                "SELECT substr(p.date, 1, 10), COALESCE(p.story_file, ''), SUM(p.success), SUM(1 - p.success), "
+                "SUM((SELECT COUNT(*) FROM mentions m WHERE m.publication_id = p.id)) "
+                "FROM publications p GROUP BY 1, 2"
+            )
+            set_meta(self.conn, 'daily_counts_built', 1)
+
+    def _insert(self, entry):
+        """Вставка одной записи истории (без фиксации транзакции)"""
+        users = entry.get('users_mentioned', [])
+        cursor = self.conn.execute(
+            "INSERT INTO publications (date, story_file, success, error, users_mentioned) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                entry['date'],
+                entry.get('story_file'),
+                1 if entry.get('success') else 0,
+                entry.get('error'),
+                json.dumps(users, ensure_ascii=False)
+            )
+        )
+        publication_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT INTO mentions (publication_id, username) VALUES (?, ?)",
+            [(publication_id, mention_key(user)) for user in users]
+        )
+        success = 1 if entry.get('success') else 0
+        self.conn.execute(
+            "INSERT INTO daily_counts (day, story_file, published, failed, mentions) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(day, story_file) DO UPDATE SET published = published + excluded.published, "
+            "failed = failed + excluded.failed, mentions = mentions + excluded.mentions",
+            (entry['date'][:10], entry.get('story_file') or '', success, 1 - success, len(users))
+        )
+        return publication_id
+
+    def append(self, entry):
+        """
+        Добавляет запись о публикации в историю
+
+        Args:
+            entry (dict): Запись в формате publishing_history.json
+                (date, story_file, users_mentioned, success, error)
+
+        Returns:
+            int: Идентификатор добавленной записи
+        """
+        with self._lock, self.conn:
+            return self._insert(entry)
+
+    def append_many(self, entries):
+        """
+        Добавляет несколько записей о публикациях одной транзакцией
+
+        Args:
+            entries (list): Записи в формате append()
+
+        Returns:
+            list: Идентификаторы добавленных записей
+        """
+        with self._lock, self.conn:
+            return [self._insert(entry) for entry in entries]
+
+    def _where(self, date_from, date_to, story_file, success, username):
+        """Формирование условия WHERE для выборок из истории"""
+        clauses = []
+        params = []
+        if date_from is not None:
+            clauses.append("p.date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("p.date <= ?")
+            params.append(date_to)
+        if story_file is not None:
+            clauses.append("p.story_file = ?")
+            params.append(os.path.basename(story_file))
+        if success is not None:
+            clauses.append("p.success = ?")
+            params.append(1 if success else 0)
+        if username is not None:
+            clauses.append("p.id IN (SELECT publication_id FROM mentions WHERE username = ?)")
+            params.append(mention_key(username))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query(self, date_from=None, date_to=None, story_file=None, success=None,
+              username=None, limit=None):
+        """
+        Выборка записей истории по индексированным полям (только записи,
+        еще не перенесенные в архив, см. rotate())
+
+        Args:
+            date_from (str, optional): Начало периода в формате "%Y-%m-%d %H:%M:%S" (включительно)
+            date_to (str, optional): Конец периода в том же формате (включительно)
+            story_file (str, optional): Имя файла сторис
+            success (bool, optional): Фильтр по успешности публикации
+            username (str, optional): Упомянутый пользователь
+            limit (int, optional): Максимальное количество записей (самые свежие)
+
+        Returns:
+            list: Записи истории в хронологическом порядке
+        """
+        where, params = self._where(date_from, date_to, story_file, success, username)
+        sql = f"SELECT * FROM publications p {where} ORDER BY p.id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._row_to_entry(row) for row in reversed(rows)]
+
+    def count(self, date_from=None, date_to=None, story_file=None, success=None, username=None):
+        """Количество записей истории, подходящих под фильтры query()"""
+        where, params = self._where(date_from, date_to, story_file, success, username)
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM publications p {where}", params).fetchone()[0]
+
+    def last_mentions(self, after_id=0):
+        """
+        Время последнего упоминания пользователей в успешных публикациях
+
+        Args:
+            after_id (int): Учитывать только записи, добавленные после записи с этим идентификатором
+
+        Returns:
+            tuple: (ключ пользователя -> дата последнего упоминания, идентификатор последней записи)
+        """
+        with self._lock:
+            last_id = self.conn.execute("SELECT MAX(id) FROM publications").fetchone()[0] or after_id
+            rows = self.conn.execute(
+                "SELECT m.username, MAX(p.date) AS date FROM publications p "
+                "JOIN mentions m ON m.publication_id = p.id "
+                "WHERE p.id > ? AND p.id <= ? AND p.success = 1 GROUP BY m.username",
+                (after_id, last_id)
+            ).fetchall()
+        return {row['username']: row['date'] for row in rows}, last_id
+
+    def daily_counts(self, date_from=None, date_to=None, story_file=None):
+        """
+        Сводка публикаций по дням и файлам сторис за всю историю, включая архив
+
+        Args:
+            date_from (str, optional): Первый день в формате "%Y-%m-%d" (включительно)
+            date_to (str, optional): Последний день в том же формате (включительно)
+            story_file (str, optional): Имя файла сторис
+
+        Returns:
+            list: Словари (day, story_file, published, failed, mentions) по возрастанию дня
+        """
+        clauses = []
+        params = []
+        if date_from is not None:
+            clauses.append("day >= ?")
+            params.append(date_from[:10])
+        if date_to is not None:
+            clauses.append("day <= ?")
+            params.append(date_to[:10])
+        if story_file is not None:
+            clauses.append("story_file = ?")
+            params.append(os.path.basename(story_file))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT day, story_file, published, failed, mentions FROM daily_counts {where} "
+                "ORDER BY day, story_file", params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _rotation_bound(self, now):
+        """Идентификатор последней записи, которую нужно перенести в архив (None - переносить нечего)"""
+        date_limit = datetime.datetime.fromtimestamp(now - self.hot_days * 86400).strftime(DATE_FORMAT)
+        bound = self.conn.execute(
+            "SELECT MAX(id) FROM publications WHERE date < ?", (date_limit,)
+        ).fetchone()[0]
+        if self.max_hot_rows:
+            # Лишние записи сверх max_hot_rows, начиная с самых старых
+            row = self.conn.execute(
+                "SELECT id FROM publications ORDER BY id DESC LIMIT 1 OFFSET ?", (self.max_hot_rows,)
+            ).fetchone()
+            if row is not None:
+                bound = max(bound or 0, row['id'])
+        if bound is None:
+            return None
+        # Записи в пределах интервала между упоминаниями нужны индексу упоминаний
+        keep_limit = datetime.datetime.fromtimestamp(now - self.keep_seconds).strftime(DATE_FORMAT)
+        first_kept = self.conn.execute(
+            "SELECT MIN(id) FROM publications WHERE date >= ?", (keep_limit,)
+        ).fetchone()[0]
+        if first_kept is not None:
+            bound = min(bound, first_kept - 1)
+        return bound if bound > 0 else None
+
+    def rotate(self, now=None):
+        """
+        Перенос старых записей в сжатый сегмент архива
+
+        Переносятся записи старше hot_days дней и самые старые записи сверх
+        max_hot_rows, но не записи за последние keep_seconds секунд.
+        Сегмент - файл JSON Lines в gzip в archive_dir; сводка по дням
+        (daily_counts) при переносе сохраняется.
+
+        Args:
+            now (float, optional): Текущее время (Unix time)
+
+        Returns:
+            str: Путь к созданному сегменту (None - переносить нечего)
+        """
+        now = time.time() if now is None else now
+        with self._lock, self.conn:
+            # Блокировка записи: другие соединения не перенесут те же записи
+            self.conn.execute("BEGIN IMMEDIATE")
+            bound = self._rotation_bound(now)
+            if bound is None:
+                return None
+            rows = self.conn.execute(
+                "SELECT * FROM publications WHERE id <= ? ORDER BY id", (bound,)
+            ).fetchall()
+            if not rows:
+                return None
+            os.makedirs(self.archive_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(self.db_path))[0]
+            path = os.path.join(self.archive_dir, f"{name}_{rows[0]['id']}-{rows[-1]['id']}.jsonl.gz")
+            tmp_path = path + '.tmp'
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                for row in rows:
+                    entry = self._row_to_entry(row)
+                    entry['id'] = row['id']
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, path)
+            self.conn.execute("DELETE FROM mentions WHERE publication_id <= ?", (bound,))
+            self.conn.execute("DELETE FROM publications WHERE id <= ?", (bound,))
+        logger.info("Перенесено в архив %s записей истории: %s", len(rows), path)
+        return path
+
+    def archive_segments(self):
+        """Сегменты архива этой базы в порядке записей"""
+        name = os.path.splitext(os.path.basename(self.db_path))[0]
+        segments = []
+        for path in glob.glob(os.path.join(glob.escape(self.archive_dir), f"{glob.escape(name)}_*.jsonl.gz")):
+            match = SEGMENT_PATTERN.search(path)
+            if match:
+                segments.append((int(match.group(1)), path))
+        return [path for _, path in sorted(segments)]
+
+    @staticmethod
+    def _segment_start(path):
+        """Дата первой записи сегмента архива (None - сегмент пуст)"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    return json.loads(line)['date']
+        return None
+
+    def archived_entries(self, date_from=None):
+        """
+        Последовательное чтение записей из архива (для запросов по всей истории)
+
+        Args:
+            date_from (str, optional): Только записи начиная с этой даты в формате
+                "%Y-%m-%d %H:%M:%S" (включительно). Сегменты, целиком более старые,
+                не читаются
+
+        Yields:
+            dict: Запись истории с полем id
+        """
+        segments = self.archive_segments()
+        if date_from is not None:
+            # Записи переносятся в архив по порядку, поэтому сегменты просматриваются
+            # с конца до первого, начинающегося раньше date_from
+            for index in range(len(segments) - 1, -1, -1):
+                start = self._segment_start(segments[index])
+                if start is not None and start < date_from:
+                    segments = segments[index:]
+                    break
+        for path in segments:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if date_from is None or entry['date'] >= date_from:
+                        yield entry
+
+    @staticmethod
+    def _row_to_entry(row):
+        """Преобразование строки таблицы в запись формата publishing_history.json"""
+        entry = {
+            "date": row['date'],
+            "story_file": row['story_file'],
+            "users_mentioned": json.loads(row['users_mentioned']),
+            "success": bool(row['success'])
+        }
+        if row['error']:
+            entry["error"] = row['error']
+        return entry
+
+    def close(self):
+        """Закрытие соединения с базой истории"""
+        with self._lock:
+            self.conn.close()
+
+
+def get_shared_history(db_path=HISTORY_DB, legacy_file=LEGACY_HISTORY_FILE):
+    """
+    Возвращает общую для процесса историю публикаций
+
+    Публикаторы всех аккаунтов и индекс упоминаний работают с одним
+    соединением, поэтому база открывается (и ротируется) один раз за процесс
+
+    Args:
+        db_path (str): Путь к базе истории
+        legacy_file (str, optional): Старый JSON-файл истории для переноса
+
+    Returns:
+        HistoryStore: Общий экземпляр истории
+    """
+    key = os.path.abspath(str(db_path))
+    history = _shared_histories.get(key)
+    if history is None:
+        history = HistoryStore(db_path, legacy_file=legacy_file)
+        _shared_histories[key] = history
+    return history
+
+
+def close_shared_histories():
+    """Закрытие всех общих экземпляров истории"""
+    while _shared_histories:
+        _, history = _shared_histories.popitem()
+        try:
+            history.close()
+        except Exception as e:
+            logger.error("Ошибка при закрытии истории публикаций: %s", e)
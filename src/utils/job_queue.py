@@ -0,0 +1,177 @@
+import datetime
+import json
+import threading
+import time
+
+from configs.settings import JOB_QUEUE_DB
+from .sqlite_store import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    run_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs(status, run_at);
+"""
+
+# Состояния задания в очереди
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+def parse_run_at(value):
+    """
+    Время запуска задания: дата и время в формате ISO 8601 (без часового
+    пояса - местное время) или '+N' - через N секунд
+
+    Args:
+        value (str): Время запуска
+
+    Returns:
+        float: Время запуска (Unix time)
+
+    Raises:
+        ValueError: Если время задано в неизвестном формате
+    """
+    value = str(value).strip()
+    if value.startswith('+'):
+        return time.time() + float(value[1:])
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+class JobQueue:
+    """
+    Постоянная очередь заданий с временем запуска для планировщика
+
+    Задания хранятся в SQLite, поэтому их можно добавлять из другого процесса,
+    пока работает планировщик. Задание, прерванное во время выполнения,
+    при следующем запуске планировщика возвращается в очередь и продолжается
+    с контрольной точки.
+    """
+
+    def __init__(self, db_path=JOB_QUEUE_DB):
+        self.db_path = str(db_path)
+        self._lock = threading.RLock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+
+    def add(self, job, run_at):
+        """
+        Добавление задания в очередь
+
+        Args:
+            job (dict): Проверенное задание (см. utils.job_spec)
+            run_at (float): Время запуска (Unix time)
+
+        Returns:
+            int: Номер задания
+        """
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO scheduled_jobs (job, run_at, created_at) VALUES (?, ?, ?)",
+                (json.dumps(job, ensure_ascii=False), run_at, time.time())
+            )
+        return cursor.lastrowid
+
+    def recover_interrupted(self):
+        """
+        Возврат в очередь заданий, выполнение которых было прервано
+
+        Returns:
+            int: Количество возвращенных заданий
+        """
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE scheduled_jobs SET status = ? WHERE status = ?", (PENDING, RUNNING)
+            )
+        return cursor.rowcount
+
+    def next_due(self, now=None):
+        """
+        Самое раннее задание, время запуска которого наступило
+
+        Args:
+            now (float, optional): Текущее время (Unix time)
+
+        Returns:
+            tuple: (номер задания, задание, продолжить ли с контрольной точки) или None
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id, job, attempts FROM scheduled_jobs WHERE status = ? AND run_at <= ? "
+                "ORDER BY run_at, id LIMIT 1",
+                (PENDING, now)
+            ).fetchone()
+        if row is None:
+            return None
+        return row['id'], json.loads(row['job']), row['attempts'] > 0
+
+    def next_run_at(self):
+        """Время запуска ближайшего ожидающего задания (None - очередь пуста)"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT MIN(run_at) AS run_at FROM scheduled_jobs WHERE status = ?", (PENDING,)
+            ).fetchone()
+        return row['run_at']
+
+    def mark_running(self, job_id):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE scheduled_jobs SET status = ?, attempts = attempts + 1, started_at = ? WHERE id = ?",
+                (RUNNING, time.time(), job_id)
+            )
+
+    def mark_finished(self, job_id, success, error=None):
+        """Отметка результата выполнения задания"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE scheduled_jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (DONE if success else FAILED, time.time(), error, job_id)
+            )
+
+    def cancel(self, job_id):
+        """
+        Отмена ожидающего задания
+
+        Returns:
+            bool: True, если задание было отменено
+        """
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE scheduled_jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, PENDING)
+            )
+        return cursor.rowcount > 0
+
+    def list_jobs(self, status=None):
+        """
+        Задания очереди в порядке времени запуска
+
+        Args:
+            status (str, optional): Только задания в этом состоянии
+
+        Returns:
+            list: Строки очереди (sqlite3.Row)
+        """
+        query = "SELECT id, job, run_at, status, attempts, started_at, finished_at, error FROM scheduled_jobs"
+        params = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        with self._lock:
+            return self.conn.execute(query + " ORDER BY run_at, id", params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
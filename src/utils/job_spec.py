@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+
+from configs.settings import CONTACTS_DIR, STORIES_DIR, DELAY_BETWEEN_STORIES, MENTION_COOLDOWN
+
+logger = logging.getLogger(__name__)
+
+# Режимы проверки (номера режимов соответствуют интерактивному меню)
+MODES = {'1': 'phone', '2': 'username', 'phone': 'phone', 'username': 'username'}
+
+# Файлы контактов по умолчанию для режимов
+DEFAULT_INPUT_FILES = {'phone': 'contacts_example.csv', 'username': 'contacts_test.csv'}
+
+# Способы выбора файла сторис для очередной публикации
+STORY_SELECTIONS = ('random', 'sequential')
+
+# Параметры задания по умолчанию
+DEFAULT_JOB = {
+    'mode': None,
+    'input_file': None,
+    'output_file': None,
+    'publish': False,
+    'story_files': [],
+    'story_selection': 'random',
+    'seed': None,
+    'users_per_story': 10,
+    'delay': DELAY_BETWEEN_STORIES,
+    'mention_cooldown': MENTION_COOLDOWN,
+    'dry_run': False,
+}
+
+
+def resolve_path(path, base_dir):
+    """Относительный путь считается от base_dir (если он еще не начинается с base_dir)"""
+    path = str(path)
+    base_dir = str(base_dir)
+    if os.path.isabs(path) or path.startswith(base_dir):
+        return path
+    return os.path.join(base_dir, path)
+
+
+def load_job_file(path):
+    """
+    Загрузка задания из JSON-файла
+
+    Args:
+        path (str): Путь к файлу задания
+
+    Returns:
+        dict: Параметры задания из файла
+
+    Raises:
+        ValueError: Если файл не содержит JSON-объект или в нем есть неизвестные параметры
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        job = json.load(f)
+    if not isinstance(job, dict):
+        raise ValueError(f"Файл задания {path} должен содержать JSON-объект")
+    unknown = set(job) - set(DEFAULT_JOB)
+    if unknown:
+        raise ValueError(f"Неизвестные параметры в файле задания {path}: {sorted(unknown)}")
+    return job
+
+
+def build_job(job_file=None, overrides=None):
+    """
+    Формирование задания: значения по умолчанию, затем файл задания, затем
+    параметры командной строки
+
+    Args:
+        job_file (str, optional): Путь к JSON-файлу задания
+        overrides (dict, optional): Параметры командной строки (None - не указан)
+
+    Returns:
+        dict: Проверенное задание с абсолютными путями
+
+    Raises:
+        ValueError: Если параметры задания некорректны
+    """
+    job = dict(DEFAULT_JOB)
+    if job_file:
+        job.update(load_job_file(job_file))
+    for key, value in (overrides or {}).items():
+        if value is not None:
+            job[key] = value
+    return validate_job(job)
+
+
+def validate_job(job):
+    """
+    Проверка и нормализация параметров задания
+
+    Args:
+        job (dict): Параметры задания
+
+    Returns:
+        dict: Задание с нормализованным режимом и абсолютными путями
+
+    Raises:
+        ValueError: Если параметры задания некорректны
+    """
+    mode = MODES.get(str(job.get('mode')).lower())
+    if not mode:
+        raise ValueError(f"Неверный режим проверки: {job.get('mode')} (ожидается phone или username)")
+    job['mode'] = mode
+
+    job['input_file'] = resolve_path(job.get('input_file') or DEFAULT_INPUT_FILES[mode], CONTACTS_DIR)
+    if job.get('output_file'):
+        job['output_file'] = str(job['output_file'])
+
+    if job['story_selection'] not in STORY_SELECTIONS:
+        raise ValueError(f"Неверный способ выбора сторис: {job['story_selection']} "
+                         f"(ожидается {' или '.join(STORY_SELECTIONS)})")
+    job['story_files'] = [resolve_path(path, STORIES_DIR) for path in job.get('story_files') or []]
+    missing = [path for path in job['story_files'] if not os.path.exists(path)]
+    if missing:
+        raise ValueError(f"Файлы сторис не найдены: {missing}")
+
+    if int(job['users_per_story']) < 1:
+        raise ValueError("Количество упоминаний в сторис должно быть положительным")
+    job['users_per_story'] = int(job['users_per_story'])
+    if float(job['delay']) < 0:
+        raise ValueError("Задержка между публикациями не может быть отрицательной")
+    job['delay'] = float(job['delay'])
+    if float(job['mention_cooldown']) < 0:
+        raise ValueError("Интервал между упоминаниями пользователя не может быть отрицательным")
+    job['mention_cooldown'] = float(job['mention_cooldown'])
+    job['publish'] = bool(job['publish'])
+    job['dry_run'] = bool(job['dry_run'])
+    return job
+
+
+def interactive_job():
+    """
+    Формирование задания по ответам пользователя (если режим не задан
+    файлом задания или аргументами командной строки)
+
+    Returns:
+        dict: Проверенное задание
+    """
+    job = dict(DEFAULT_JOB)
+    job['mode'] = input("Выберите режим проверки (1 - по номеру телефона, 2 - по юзернейму): ")
+    mode = MODES.get(job['mode'])
+    if mode == 'phone':
+        job['input_file'] = input(f"Введите путь к файлу с номерами (или нажмите Enter для '{DEFAULT_INPUT_FILES[mode]}'): ")
+    elif mode == 'username':
+        job['input_file'] = input(f"Введите путь к файлу с юзернеймами (или нажмите Enter для '{DEFAULT_INPUT_FILES[mode]}'): ")
+    job = validate_job(job)
+    # Подтверждение публикации запрашивается после проверки контактов
+    job['publish'] = None
+    return job
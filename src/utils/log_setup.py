@@ -0,0 +1,102 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+from configs.settings import LOG_FILE, LOG_JSON_FILE, LOG_LEVEL
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Стандартные атрибуты LogRecord: все остальные атрибуты переданы через extra
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Запись лога в виде одной строки JSON (формат JSON Lines)
+
+    Поля: time, level, logger, message, а также exception при наличии
+    исключения и все поля, переданные через extra
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Передача записей в очередь без форматирования
+
+    Стандартный QueueHandler форматирует сообщение в вызывающем потоке.
+    Здесь подстановка аргументов выполняется потоком QueueListener, поэтому
+    в аргументах лога нельзя передавать объекты, которые меняются после вызова
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, log_file=LOG_FILE, json_file=LOG_JSON_FILE):
+    """
+    Настройка логирования через очередь
+
+    Вызовы логгера только ставят запись в очередь, а форматирование и запись
+    в консоль, текстовый лог и JSON-лог выполняет отдельный поток
+    QueueListener. Поток останавливается при завершении процесса.
+
+    Args:
+        level (str): Уровень логирования
+        log_file (str): Текстовый лог (None - не записывать)
+        json_file (str): Лог в формате JSON Lines (None - не записывать)
+    """
+    global _listener
+    stop_logging()
+
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    if json_file:
+        os.makedirs(os.path.dirname(str(json_file)) or '.', exist_ok=True)
+        json_handler = logging.FileHandler(json_file, encoding='utf-8')
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Запись оставшихся в очереди сообщений и остановка потока логирования"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,284 @@
+import json
+import logging
+import os
+import random
+import shutil
+import struct
+import subprocess
+import time
+
+from configs.settings import STORIES_DIR, MEDIA_CATALOG_DB, MEDIA_RESCAN_INTERVAL
+from .sqlite_store import connect
+from .upload_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+STORY_EXTENSIONS = PHOTO_EXTENSIONS + VIDEO_EXTENSIONS
+
+MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.mp4': 'video/mp4',
+    '.mov': 'video/quicktime',
+    '.avi': 'video/x-msvideo',
+}
+
+# Параметры по умолчанию, если метаданные видео определить не удалось
+DEFAULT_VIDEO_DURATION = 15
+DEFAULT_WIDTH = 1080
+DEFAULT_HEIGHT = 1920
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    file_hash TEXT NOT NULL
+);
+"""
+
+MEDIA_FIELDS = ('path', 'size', 'mtime_ns', 'kind', 'mime_type', 'duration', 'width', 'height', 'file_hash')
+
+# Общие экземпляры каталога на процесс (по директории сторис)
+_shared_catalogs = {}
+
+
+def _image_size(path):
+    """
+    Определяет размеры изображения JPEG или PNG по заголовку файла
+
+    Returns:
+        tuple: (ширина, высота) или (None, None), если формат не распознан
+    """
+    with open(path, 'rb') as f:
+        head = f.read(26)
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            width, height = struct.unpack('>II', head[16:24])
+            return width, height
+        if not head.startswith(b'\xff\xd8'):
+            return None, None
+        # Ищем маркер SOF в JPEG
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None, None
+            code = marker[1]
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None, None
+            length = struct.unpack('>H', length_bytes)[0]
+            if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>xHH', f.read(5))
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _video_info(path):
+    """
+    Определяет длительность и размеры видео с помощью ffprobe (если установлен)
+
+    Returns:
+        tuple: (длительность, ширина, высота) или (None, None, None)
+    """
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        return None, None, None
+    try:
+        output = subprocess.run(
+            [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=width,height:format=duration', '-of', 'json', path],
+            capture_output=True, check=True, timeout=30
+        ).stdout
+        info = json.loads(output)
+        stream = (info.get('streams') or [{}])[0]
+        duration = info.get('format', {}).get('duration')
+        return (float(duration) if duration else None,
+                stream.get('width'), stream.get('height'))
+    except Exception as e:
+        logger.warning("Не удалось получить метаданные видео %s: %s", path, e)
+        return None, None, None
+
+
+def probe_media(path, stat=None):
+    """
+    Собирает метаданные медиафайла сторис
+
+    Args:
+        path (str): Путь к файлу
+        stat (os.stat_result, optional): Результат stat, если уже получен
+
+    Returns:
+        dict: Метаданные файла (тип, MIME, длительность, размеры, хэш) или None для
+            неподдерживаемых форматов
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in STORY_EXTENSIONS:
+        return None
+    stat = stat or os.stat(path)
+    info = {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'mime_type': MIME_TYPES[ext],
+        'duration': None,
+    }
+    if ext in PHOTO_EXTENSIONS:
+        info['kind'] = 'photo'
+        try:
+            info['width'], info['height'] = _image_size(path)
+        except (IOError, struct.error):
+            info['width'], info['height'] = None, None
+    else:
+        info['kind'] = 'video'
+        info['duration'], info['width'], info['height'] = _video_info(path)
+        if info['duration'] is None:
+            logger.debug("Метаданные видео %s недоступны, используются значения по умолчанию", path)
+            info['duration'] = DEFAULT_VIDEO_DURATION
+        info['width'] = info['width'] or DEFAULT_WIDTH
+        info['height'] = info['height'] or DEFAULT_HEIGHT
+    info['file_hash'] = file_digest(path)
+    return info
+
+
+class MediaCatalog:
+    """Каталог медиафайлов сторис с кэшированными метаданными"""
+
+    def __init__(self, stories_dir=STORIES_DIR, db_path=MEDIA_CATALOG_DB,
+                 rescan_interval=MEDIA_RESCAN_INTERVAL):
+        self.stories_dir = os.path.abspath(str(stories_dir))
+        self.rescan_interval = rescan_interval
+        self.conn = connect(str(db_path))
+        self.conn.executescript(SCHEMA)
+        self.items = {}
+        # Метаданные файлов вне директории сторис (например, подготовленных) - только в памяти
+        self._extra = {}
+        self._last_scan = None
+        self._load()
+
+    def _load(self):
+        """Загрузка ранее собранных метаданных файлов из базы"""
+        rows = self.conn.execute(
+            "SELECT * FROM media WHERE path LIKE ?", (os.path.join(self.stories_dir, '%'),)
+        ).fetchall()
+        self.items = {row['path']: {field: row[field] for field in MEDIA_FIELDS} for row in rows}
+
+    def _store(self, info):
+        """Сохранение метаданных файла в базе (до фиксации транзакции)"""
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO media ({', '.join(MEDIA_FIELDS)}) "
+            f"VALUES ({', '.join('?' for _ in MEDIA_FIELDS)})",
+            [info[field] for field in MEDIA_FIELDS]
+        )
+
+    def refresh(self, force=False):
+        """
+        Инкрементальное сканирование директории сторис
+
+        Метаданные пересчитываются только для новых файлов и файлов, у которых
+        изменились размер или время изменения
+
+        Args:
+            force (bool): Сканировать, даже если не прошел интервал MEDIA_RESCAN_INTERVAL
+        """
+        now = time.monotonic()
+        if not force and self._last_scan is not None and now - self._last_scan < self.rescan_interval:
+            return
+        self._last_scan = now
+
+        seen = set()
+        changed = 0
+        if os.path.isdir(self.stories_dir):
+            with os.scandir(self.stories_dir) as entries:
+                for entry in entries:
+                    if not entry.is_file() or not entry.name.lower().endswith(STORY_EXTENSIONS):
+                        continue
+                    path = os.path.abspath(entry.path)
+                    seen.add(path)
+                    stat = entry.stat()
+                    cached = self.items.get(path)
+                    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+                        continue
+                    try:
+                        info = probe_media(path, stat)
+                    except OSError as e:
+                        logger.warning("Не удалось прочитать файл сторис %s: %s", path, e)
+                        continue
+                    self.items[path] = info
+                    self._store(info)
+                    changed += 1
+
+        removed = [path for path in self.items if path not in seen]
+        for path in removed:
+            del self.items[path]
+        self.conn.executemany("DELETE FROM media WHERE path = ?", [(path,) for path in removed])
+        self.conn.commit()
+        if changed or removed:
+            logger.info("Каталог сторис обновлен: %s новых/измененных, %s удалено", changed, len(removed))
+
+    def files(self):
+        """Список путей ко всем файлам сторис"""
+        self.refresh()
+        return sorted(self.items)
+
+    def random_file(self):
+        """Случайный файл сторис или None, если файлов нет"""
+        files = self.files()
+        return random.choice(files) if files else None
+
+    def describe(self, path):
+        """
+        Метаданные файла сторис
+
+        Для файлов вне каталога или измененных с момента сканирования метаданные
+        собираются заново
+
+        Returns:
+            dict или None: Метаданные файла или None для неподдерживаемых форматов
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        in_catalog = os.path.dirname(path) == self.stories_dir
+        known = self.items if in_catalog else self._extra
+        info = known.get(path)
+        if info and info['size'] == stat.st_size and info['mtime_ns'] == stat.st_mtime_ns:
+            return info
+        info = probe_media(path, stat)
+        if info:
+            known[path] = info
+            if in_catalog:
+                self._store(info)
+                self.conn.commit()
+        return info
+
+    def close(self):
+        """Закрытие соединения с базой каталога"""
+        self.conn.close()
+
+
+def get_shared_catalog(stories_dir=STORIES_DIR):
+    """Возвращает общий для процесса каталог медиафайлов сторис"""
+    key = os.path.abspath(str(stories_dir))
+    catalog = _shared_catalogs.get(key)
+    if catalog is None:
+        catalog = MediaCatalog(stories_dir)
+        _shared_catalogs[key] = catalog
+    return catalog
+
+
+def close_shared_catalogs():
+    """Закрытие всех общих каталогов медиафайлов"""
+    while _shared_catalogs:
+        _, catalog = _shared_catalogs.popitem()
+        try:
+            catalog.close()
+        except Exception as e:
+            logger.error("Ошибка при закрытии каталога медиафайлов: %s", e)
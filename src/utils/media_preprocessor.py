@@ -0,0 +1,193 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from configs.settings import (
+    PROCESSED_DIR, STORY_WIDTH, STORY_HEIGHT, STORY_MAX_DURATION, PREPROCESS_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+# Общий экземпляр подготовки медиа на процесс
+_shared_preprocessor = None
+# Предупреждение об отсутствии необязательных зависимостей выводится один раз за процесс
+_dependencies_checked = False
+
+
+def check_media_dependencies():
+    """Предупреждение при запуске, если для подготовки медиа не установлен Pillow"""
+    global _dependencies_checked
+    if _dependencies_checked:
+        return
+    _dependencies_checked = True
+    # Проверка без импорта: Pillow загружается только в процессах подготовки
+    if importlib.util.find_spec('PIL') is None:
+        logger.warning("Pillow не установлен: изображения будут публиковаться без приведения к формату сторис "
+                       "(pip install Pillow)")
+
+
+def output_path_for(info, output_dir=PROCESSED_DIR):
+    """Путь к подготовленному файлу для исходного файла с метаданными info"""
+    ext = '.jpg' if info['kind'] == 'photo' else '.mp4'
+    return os.path.join(str(output_dir), info['file_hash'] + ext)
+
+
+def _prepare_photo(source, target):
+    """Приведение изображения к JPEG 1080x1920 с сохранением пропорций"""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:  # Pillow необязателен: без него изображения публикуются как есть
+        return None
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        if image.size != (STORY_WIDTH, STORY_HEIGHT):
+            image = ImageOps.pad(image, (STORY_WIDTH, STORY_HEIGHT), color=(0, 0, 0))
+        image.save(target, 'JPEG', quality=85, optimize=True, progressive=True)
+    return target
+
+
+def _prepare_video(source, target):
+    """Перекодирование видео в MP4 (H.264/AAC) 1080x1920 с помощью ffmpeg"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    video_filter = (
+        f"scale={STORY_WIDTH}:{STORY_HEIGHT}:force_original_aspect_ratio=decrease,"
+        f"pad={STORY_WIDTH}:{STORY_HEIGHT}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
+    subprocess.run(
+        [ffmpeg, '-y', '-v', 'error', '-i', source, '-t', str(STORY_MAX_DURATION),
+         '-vf', video_filter, '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23',
+         '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart',
+         target],
+        capture_output=True, check=True
+    )
+    return target
+
+
+def preprocess_file(source, info, output_dir=PROCESSED_DIR):
+    """
+    Подготовка одного медиафайла к формату сторис (выполняется в отдельном процессе)
+
+    Args:
+        source (str): Путь к исходному файлу
+        info (dict): Метаданные файла из каталога сторис
+        output_dir (str): Директория для подготовленных файлов
+
+    Returns:
+        str или None: Путь к подготовленному файлу или None, если подготовка недоступна
+    """
+    target = output_path_for(info, output_dir)
+    if os.path.exists(target):
+        return target
+    os.makedirs(str(output_dir), exist_ok=True)
+    # Пишем во временный файл, чтобы прерванная подготовка не оставила битый результат
+    ext = os.path.splitext(target)[1]
+    tmp_target = f"{target[:-len(ext)]}.{os.getpid()}.tmp{ext}"
+    try:
+        if info['kind'] == 'photo':
+            result = _prepare_photo(source, tmp_target)
+        else:
+            result = _prepare_video(source, tmp_target)
+        if result is None:
+            return None
+        os.replace(tmp_target, target)
+        return target
+    finally:
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+
+
+class MediaPreprocessor:
+    """Подготовка медиафайлов сторис в пуле процессов с кэшированием по хэшу содержимого"""
+
+    def __init__(self, catalog, output_dir=PROCESSED_DIR, workers=PREPROCESS_WORKERS):
+        self.catalog = catalog
+        self.output_dir = str(output_dir)
+        self.workers = workers
+        self._executor = None
+
+    def _get_executor(self):
+        """Ленивое создание пула процессов"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def processed_path(self, source):
+        """
+        Путь к подготовленной версии файла, если она уже есть
+
+        Returns:
+            str или None: Путь к подготовленному файлу
+        """
+        info = self.catalog.describe(source)
+        if not info:
+            return None
+        target = output_path_for(info, self.output_dir)
+        return target if os.path.exists(target) else None
+
+    async def prepare(self, sources):
+        """
+        Подготовка файлов сторис в пуле процессов, не блокируя цикл событий
+
+        Уже подготовленные файлы повторно не обрабатываются
+
+        Args:
+            sources (list): Пути к исходным файлам
+
+        Returns:
+            dict: Исходный путь -> путь к подготовленному файлу (или исходный, если
+                подготовка недоступна или завершилась ошибкой)
+        """
+        loop = asyncio.get_running_loop()
+        results = {}
+        pending = {}
+        for source in sources:
+            info = self.catalog.describe(source)
+            if not info:
+                continue
+            target = output_path_for(info, self.output_dir)
+            if os.path.exists(target):
+                results[source] = target
+            else:
+                pending[source] = loop.run_in_executor(
+                    self._get_executor(), preprocess_file, source, info, self.output_dir
+                )
+
+        if pending:
+            logger.info("Подготовка %s медиафайлов к формату сторис", len(pending))
+        for source, future in pending.items():
+            try:
+                target = await future
+            except Exception as e:
+                logger.warning("Не удалось подготовить файл %s: %s", source, e)
+                target = None
+            results[source] = target or source
+        return results
+
+    def close(self):
+        """Остановка пула процессов"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def get_shared_preprocessor():
+    """Возвращает общий для процесса экземпляр подготовки медиа"""
+    global _shared_preprocessor
+    if _shared_preprocessor is None:
+        from .media_catalog import get_shared_catalog
+        _shared_preprocessor = MediaPreprocessor(get_shared_catalog())
+    return _shared_preprocessor
+
+
+def close_shared_preprocessor():
+    """Остановка пула процессов общего экземпляра подготовки медиа"""
+    global _shared_preprocessor
+    if _shared_preprocessor is not None:
+        _shared_preprocessor.close()
+        _shared_preprocessor = None
@@ -0,0 +1,120 @@
+import datetime
+import time
+
+from configs.settings import MENTION_COOLDOWN
+from .history_store import get_shared_history, mention_key, DATE_FORMAT
+
+
+def _user_key(user):
+    """Ключ пользователя в истории публикаций (как в mention_key)"""
+    return user.username_key or str(user.user_id)
+
+
+class MentionCooldown:
+    """
+    Индекс времени последнего упоминания пользователей
+
+    Индекс строится по истории публикаций один раз, затем дочитываются только
+    новые записи истории, а публикации текущего процесса учитываются сразу,
+    не дожидаясь записи истории на диск. Проверка пользователя - поиск в словаре.
+    """
+
+    def __init__(self, history=None, cooldown=MENTION_COOLDOWN):
+        self.history = history if history is not None else get_shared_history()
+        self.cooldown = cooldown
+        # Ключ пользователя -> время последнего упоминания (Unix time)
+        self.last_mentioned = {}
+        self._last_id = 0
+        # Самый длинный интервал, для которого уже прочитан архив истории
+        self._archive_window = self.history.keep_seconds
+        self.refresh()
+
+    def _update(self, key, mentioned_at):
+        if mentioned_at > self.last_mentioned.get(key, 0):
+            self.last_mentioned[key] = mentioned_at
+
+    def refresh(self):
+        """Дочитывание записей истории, добавленных после предыдущего обновления"""
+        mentions, self._last_id = self.history.last_mentions(self._last_id)
+        for key, date in mentions.items():
+            try:
+                self._update(key, datetime.datetime.strptime(date, DATE_FORMAT).timestamp())
+            except ValueError:
+                # Записи старого формата без времени публикации не учитываются
+                continue
+
+    def _load_archive(self, cooldown):
+        """
+        Чтение упоминаний из архива истории для интервала длиннее, чем хранится в базе
+
+        Args:
+            cooldown (float): Интервал между упоминаниями в секундах
+        """
+        if cooldown <= self._archive_window:
+            return
+        date_from = datetime.datetime.fromtimestamp(time.time() - cooldown).strftime(DATE_FORMAT)
+        for entry in self.history.archived_entries(date_from):
+            if not entry.get('success'):
+                continue
+            try:
+                mentioned_at = datetime.datetime.strptime(entry['date'], DATE_FORMAT).timestamp()
+            except ValueError:
+                continue
+            for user in entry.get('users_mentioned', []):
+                self._update(mention_key(user), mentioned_at)
+        self._archive_window = cooldown
+
+    def record(self, users, mentioned_at=None):
+        """
+        Учет упоминания пользователей в опубликованной сторис
+
+        Args:
+            users (list): Упомянутые пользователи (UserRecord)
+            mentioned_at (float, optional): Время публикации (по умолчанию текущее)
+        """
+        mentioned_at = time.time() if mentioned_at is None else mentioned_at
+        for user in users:
+            self._update(_user_key(user), mentioned_at)
+
+    def filter(self, users, cooldown=None):
+        """
+        Отбор пользователей, которых можно упомянуть
+
+        Args:
+            users (list): Пользователи (UserRecord)
+            cooldown (float, optional): Интервал между упоминаниями в секундах
+                (по умолчанию заданный при создании, 0 - без ограничения)
+
+        Returns:
+            tuple: (пользователи вне интервала, количество пропущенных)
+        """
+        cooldown = self.cooldown if cooldown is None else cooldown
+        if not cooldown:
+            return list(users), 0
+        self.refresh()
+        self._load_archive(cooldown)
+        threshold = time.time() - cooldown
+        allowed = [user for user in users if self.last_mentioned.get(_user_key(user), 0) <= threshold]
+        return allowed, len(users) - len(allowed)
+
+
+_shared_cooldown = None
+
+
+def get_shared_cooldown():
+    """
+    Возвращает общий для процесса индекс упоминаний
+
+    Returns:
+        MentionCooldown: Общий индекс упоминаний
+    """
+    global _shared_cooldown
+    if _shared_cooldown is None:
+        _shared_cooldown = MentionCooldown()
+    return _shared_cooldown
+
+
+def close_shared_cooldown():
+    """Сброс общего индекса упоминаний (он ссылается на общую историю, закрываемую вместе с ним)"""
+    global _shared_cooldown
+    _shared_cooldown = None
@@ -0,0 +1,216 @@
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+
+from configs.settings import METRICS_FILE
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм времени (в секундах)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Описания метрик для экспорта в формате Prometheus
+METRIC_HELP = {
+    'story_stage_seconds': "Время выполнения этапов публикации сторис",
+    'contact_lookup_seconds': "Время проверки одного контакта",
+    'contact_lookups_total': "Количество проверок контактов",
+    'stories_published_total': "Количество попыток публикации сторис",
+    'retries_total': "Количество повторов запросов к Telegram",
+    'flood_wait_seconds_total': "Суммарное ожидание по FloodWait в секундах",
+}
+
+
+def _escape_label(value):
+    """Экранирование значения метки для текстового формата Prometheus"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    """Метки серии в виде {name="value",...}"""
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in items) + '}'
+
+
+def _format_value(value):
+    """Число в текстовом формате Prometheus"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма длительностей одной серии метрики"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """Накопленные значения корзин (le -> количество), включая +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+        yield float('inf'), self.count
+
+
+class MetricsRegistry:
+    """
+    Счетчики и гистограммы длительностей этапов работы
+
+    Серии метрик различаются метками (например, stage="send_story"). Результаты
+    экспортируются в текстовом формате Prometheus и в виде сводки для лога.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Увеличение счетчика"""
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Добавление значения в гистограмму"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """
+        Замер длительности блока кода (в том числе блока с await)
+
+        Длительность записывается и при выходе из блока с исключением
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        """Сброс всех метрик"""
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started_at = time.perf_counter()
+
+    def to_prometheus(self):
+        """
+        Метрики в текстовом формате Prometheus
+
+        Returns:
+            str: Текст для экспорта
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+
+        written = set()
+        for (name, labels), value in counters:
+            if name not in written:
+                written.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), histogram in histograms:
+            if name not in written:
+                written.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in histogram.cumulative():
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, path=METRICS_FILE):
+        """
+        Запись метрик в файл в формате Prometheus (textfile collector)
+
+        Args:
+            path (str): Путь к файлу метрик
+        """
+        path = str(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+        logger.info("Метрики сохранены в %s", path)
+
+    def summary(self):
+        """
+        Сводка по запуску: где было потрачено время
+
+        Returns:
+            str: Таблица с количеством, суммарным, средним и максимальным временем
+                 каждой серии и ее долей от общего времени работы
+        """
+        elapsed = time.perf_counter() - self.started_at
+        with self._lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: -item[1].sum)
+            counters = sorted(self.counters.items())
+
+        lines = [f"Сводка по запуску (общее время {elapsed:.2f} с):"]
+        for (name, labels), histogram in histograms:
+            series = f"{name}{_format_labels(labels)}"
+            share = histogram.sum / elapsed * 100 if elapsed else 0.0
+            lines.append(
+                f"  {series}: {histogram.count} раз, всего {histogram.sum:.3f} с "
+                f"({share:.1f}%), в среднем {histogram.sum / histogram.count:.3f} с, "
+                f"максимум {histogram.max:.3f} с"
+            )
+        for (name, labels), value in counters:
+            lines.append(f"  {name}{_format_labels(labels)}: {value}")
+        return "\n".join(lines)
+
+
+_shared_metrics = None
+
+
+def get_shared_metrics():
+    """
+    Возвращает общий для процесса реестр метрик
+
+    Returns:
+        MetricsRegistry: Общий реестр метрик
+    """
+    global _shared_metrics
+    if _shared_metrics is None:
+        _shared_metrics = MetricsRegistry()
+    return _shared_metrics
@@ -0,0 +1,90 @@
+import contextlib
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Количество кадров стека, сохраняемых для каждого выделения памяти
+TRACEMALLOC_FRAMES = 10
+
+
+def profile_paths(output_dir, name='telegram_stories'):
+    """
+    Пути к файлам результатов профилирования
+
+    Args:
+        output_dir (str): Директория для файлов (рядом с логом)
+        name (str): Базовое имя файлов
+
+    Returns:
+        dict: Пути к профилю cProfile, снимку tracemalloc и текстовой сводке
+    """
+    return {
+        'cprofile': os.path.join(output_dir, f"{name}.prof"),
+        'tracemalloc': os.path.join(output_dir, f"{name}.tracemalloc"),
+        'summary': os.path.join(output_dir, f"{name}_profile.txt"),
+    }
+
+
+def _format_summary(profiler, snapshot, elapsed, peak, top):
+    """Текстовая сводка: самые затратные функции и места выделения памяти"""
+    out = io.StringIO()
+    out.write(f"Общее время работы: {elapsed:.2f} с\n")
+    out.write(f"Пиковый объем отслеживаемой памяти: {peak / 1024 / 1024:.1f} МБ\n\n")
+
+    for sort_key, title in (('cumulative', "по суммарному времени"), ('tottime', "по собственному времени")):
+        out.write(f"=== Топ-{top} функций {title} ===\n")
+        stats = pstats.Stats(profiler, stream=out)
+        stats.strip_dirs().sort_stats(sort_key).print_stats(top)
+        out.write("\n")
+
+    out.write(f"=== Топ-{top} мест выделения памяти ===\n")
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        out.write(f"{frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} КБ в {stat.count} блоках\n")
+    return out.getvalue()
+
+
+@contextlib.contextmanager
+def profile_run(output_dir, top=30, name='telegram_stories'):
+    """
+    Профилирование всего запуска: cProfile (включая корутины, выполняемые в
+    цикле событий asyncio) и снимок выделений памяти tracemalloc
+
+    Результаты записываются в output_dir: профиль для pstats/snakeviz (.prof),
+    снимок tracemalloc (.tracemalloc) и текстовая сводка с топ-N позиций.
+    Работа в пуле процессов подготовки медиа в профиль не попадает.
+
+    Args:
+        output_dir (str): Директория для файлов результатов
+        top (int): Количество позиций в сводке
+        name (str): Базовое имя файлов
+    """
+    paths = profile_paths(output_dir, name)
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield paths
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        try:
+            profiler.dump_stats(paths['cprofile'])
+            snapshot.dump(paths['tracemalloc'])
+            summary = _format_summary(profiler, snapshot, elapsed, peak, top)
+            with open(paths['summary'], 'w', encoding='utf-8') as f:
+                f.write(summary)
+            logger.info("Результаты профилирования сохранены: %s, %s, %s",
+                        paths['cprofile'], paths['tracemalloc'], paths['summary'])
+        except Exception as e:
+            logger.error("Ошибка при сохранении результатов профилирования: %s", e)
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import random
+import time
+
+from telethon import errors
+
+from configs.settings import MAX_RETRIES, RETRY_BASE_DELAY, RETRY_MAX_DELAY, MAX_FLOOD_WAIT
+from .metrics import get_shared_metrics
+
+logger = logging.getLogger(__name__)
+
+# Классы ошибок
+FLOOD_WAIT = 'flood_wait'  # Сервер указал, сколько нужно подождать
+RETRYABLE = 'retryable'    # Временная ошибка сети или сервера
+FATAL = 'fatal'            # Повтор не поможет
+
+# Временные ошибки сервера Telegram
+SERVER_ERRORS = (errors.ServerError, errors.RpcCallFailError, errors.TimedOutError)
+
+# Сетевые ошибки
+NETWORK_ERRORS = (ConnectionError, asyncio.TimeoutError, TimeoutError)
+
+
+def classify_error(error):
+    """
+    Классификация ошибки запроса к Telegram
+
+    Args:
+        error (Exception): Ошибка
+
+    Returns:
+        str: FLOOD_WAIT, RETRYABLE или FATAL
+    """
+    if isinstance(error, errors.RPCError) and getattr(error, 'seconds', None) is not None:
+        return FLOOD_WAIT
+    if isinstance(error, SERVER_ERRORS) or isinstance(error, NETWORK_ERRORS):
+        return RETRYABLE
+    # Ошибки с кодом 5xx (в том числе не описанные в Telethon) - временные
+    code = getattr(error, 'code', None)
+    if isinstance(error, errors.RPCError) and isinstance(code, int) and (code >= 500 or code == -503):
+        return RETRYABLE
+    return FATAL
+
+
+class RetryPolicy:
+    """
+    Единая политика повторов запросов к Telegram
+
+    FloodWait ожидается ровно столько, сколько указал сервер (если не дольше
+    max_flood_wait), временные ошибки повторяются с экспоненциальной паузой со
+    случайным разбросом, остальные ошибки пробрасываются сразу.
+    max_retries - количество повторов: всего выполняется до max_retries + 1 попыток.
+    """
+
+    def __init__(self, max_retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 max_flood_wait=MAX_FLOOD_WAIT):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_flood_wait = max_flood_wait
+        self.metrics = get_shared_metrics()
+
+    def backoff(self, attempt):
+        """Пауза перед повтором номер attempt (с 1): половина фиксирована, половина случайна"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def call(self, operation, func, *args, **kwargs):
+        """
+        Выполнение запроса с повторами
+
+        Args:
+            operation (str): Название операции для логов и метрик
+            func (callable): Асинхронная функция запроса
+            *args, **kwargs: Аргументы функции
+
+        Returns:
+            Результат функции
+
+        Raises:
+            Exception: Фатальная ошибка, слишком долгий FloodWait или ошибка
+                последней попытки
+        """
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                attempt += 1
+                if kind == FATAL or attempt > self.max_retries:
+                    raise
+                if kind == FLOOD_WAIT:
+                    if e.seconds > self.max_flood_wait:
+                        logger.error("%s: требуется ожидание %s с, больше допустимых %s с",
+                                     operation, e.seconds, self.max_flood_wait)
+                        raise
+                    delay = e.seconds
+                    self.metrics.inc('flood_wait_seconds_total', delay, operation=operation)
+                else:
+                    delay = self.backoff(attempt)
+                self.metrics.inc('retries_total', operation=operation, reason=kind)
+                logger.warning("%s: %s. Повтор %s/%s через %.1f с", operation, e, attempt, self.max_retries, delay,
+                               extra={'operation': operation, 'reason': kind, 'attempt': attempt, 'delay': delay})
+                await asyncio.sleep(delay)
+
+
+class Pacer:
+    """
+    Минимальный интервал между запросами
+
+    В отличие от фиксированной паузы после каждого запроса, время выполнения
+    самого запроса засчитывается в интервал, а перед первым запросом пауза не нужна
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = None
+
+    async def wait(self):
+        """Ожидание до истечения интервала с момента предыдущего вызова"""
+        now = time.monotonic()
+        if self._last is not None:
+            remaining = self.interval - (now - self._last)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                now = time.monotonic()
+        self._last = now
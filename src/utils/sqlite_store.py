@@ -0,0 +1,37 @@
+import os
+import sqlite3
+
+
+def connect(db_path):
+    """
+    Открывает соединение с базой SQLite в режиме WAL
+
+    Args:
+        db_path (str): Путь к файлу базы данных
+
+    Returns:
+        sqlite3.Connection: Соединение с базой
+    """
+    os.makedirs(os.path.dirname(str(db_path)), exist_ok=True)
+    conn = sqlite3.connect(str(db_path), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL позволяет дописывать данные без перезаписи всего файла
+    # и переживает падение процесса посреди записи
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def get_meta(conn, key, default=None):
+    """Чтение служебного значения из таблицы meta"""
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else default
+
+
+def set_meta(conn, key, value):
+    """Запись служебного значения в таблицу meta"""
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, str(value))
+    )
@@ -1,113 +1,391 @@
 import logging
 import os
-import random
-import asyncio
-from telethon.tl.types import InputUser
-from telethon.tl.functions.contacts import ResolveUsernameRequest
 from telethon import functions, types
 import time
-from pathlib import Path
-import json
 import datetime
-from configs.settings import STORIES_DIR, MAX_MENTIONS_PER_STORY, DELAY_BETWEEN_STORIES
+import weakref
+from collections import deque
+from configs.settings import (
+    STORIES_DIR, MAX_MENTIONS_PER_STORY, DELAY_BETWEEN_STORIES, STORIES_CHECK_TTL, MENTION_COOLDOWN,
+    DRY_RUN_HISTORY_DB, DRY_RUN_REQUESTS_FILE
+)
+from .history_store import get_shared_history
+from .upload_cache import get_shared_upload_cache, is_reference_error, extract_story_media
+from .user_cache import get_shared_cache
+from .media_catalog import get_shared_catalog
+from .media_preprocessor import get_shared_preprocessor
+from .metrics import get_shared_metrics
+from .retry_policy import RetryPolicy, Pacer
+from .background_writer import get_shared_writer
+from .mention_cooldown import get_shared_cooldown
+from .suppression_list import get_shared_suppression
+from .dry_run import placeholder_file, serialize_request, append_lines
+from .checkpoint_store import account_key
 
 logger = logging.getLogger(__name__)
 
+# Результаты проверки доступности сторис по клиентам: client -> (время проверки, результат)
+_stories_availability = weakref.WeakKeyDictionary()
+
+# Ошибки публикации, после которых доступность сторис нужно проверить заново
+CAPABILITY_ERRORS = ('PREMIUM_ACCOUNT_REQUIRED', 'STORIES_TOO_MUCH', 'USER_RESTRICTED', 'STORIES_DISABLED')
+
+# Периоды публикации сторис в секундах: 24 часа, затем запасные значения
+# (12, 6, 48, 1 час), если сервер отклонит период ошибкой STORY_PERIOD_INVALID
+STORY_PERIODS = (86400, 43200, 21600, 172800, 3600)
+
+# Базовый текст подписи
+STORY_CAPTION = "Тестирую авто упоминание в сторис! Если интересно то напиши свой ник телеграм в коментарий под постом о сторис https://t.me/+VwfeREo_kNNkMjQ6                                               "
+
+# Настройки размера и расположения тегов на медиа (размещаем теги по вертикали, в колонку)
+TAG_WIDTH = 0.3    # 30% от ширины экрана
+TAG_HEIGHT = 0.05  # 5% от высоты экрана
+TAG_SPACING = 0.01 # Промежуток между тегами (1% от высоты)
+TAG_START_X = 0.05 # Начальная позиция по X (5% от левого края)
+TAG_START_Y = 0.15 # Начальная позиция по Y (15% от верха)
+TAG_MAX_Y = 0.9    # Не размещаем теги ниже 90% высоты
+
+
+def _tag_y(index):
+    """Позиция Y тега с порядковым номером index"""
+    return TAG_START_Y + index * (TAG_HEIGHT + TAG_SPACING)
+
+
+# Количество тегов, которые помещаются на медиа
+MAX_TAGS = 0
+while _tag_y(MAX_TAGS) + TAG_HEIGHT <= TAG_MAX_Y:
+    MAX_TAGS += 1
+
+
+def build_story_layout(mentions, caption=STORY_CAPTION):
+    """
+    Формирует подпись с упоминаниями, entities для подписи и медиа-области тегов
+    
+    Args:
+        mentions (list): Пары (UserRecord, InputPeerUser) в порядке упоминания
+        caption (str): Базовый текст подписи
+    
+    Returns:
+        tuple: (подпись, список MessageEntityMention, список медиа-областей)
+    """
+    parts = [caption]
+    offset = len(caption)
+    entities = []
+    media_areas = []
+    
+    for i, (user, input_user) in enumerate(mentions):
+        # Если тег выходит за пределы допустимой области
+        current_y = _tag_y(i)
+        if current_y + TAG_HEIGHT > TAG_MAX_Y:
+            logger.warning("Не удалось разместить все упоминания на сторис - не хватает места")
+            break
+        
+        # Создаем медиа-область для тега пользователя
+        media_areas.append(types.InputMediaAreaChannelPost(
+            coordinates=types.MediaAreaCoordinates(
+                x=TAG_START_X,
+                y=current_y,
+                w=TAG_WIDTH,
+                h=TAG_HEIGHT,
+                rotation=0.0
+            ),
+            channel=input_user,
+            msg_id=0  # 0 означает тег пользователя без конкретного сообщения
+        ))
+        
+        # Упомянуть в подписи можно только пользователя с публичным username
+        username = user.username
+        if not username:
+            continue
+        
+        # Также добавляем упоминание в текст подписи
+        mention_text = f"@{username}"
+        parts.append(mention_text + " ")
+        entities.append(types.MessageEntityMention(
+            offset=offset,
+            length=len(mention_text)
+        ))
+        offset += len(mention_text) + 1
+    
+    return "".join(parts), entities, media_areas
+
 class StoryPublisher:
     """Класс для публикации сторис с упоминаниями пользователей"""
     
-    def __init__(self, client_data):
+    def __init__(self, client_data, dry_run=False, dry_run_file=DRY_RUN_REQUESTS_FILE):
         # Если передан словарь с клиентом, извлекаем объект клиента
         if isinstance(client_data, dict) and 'client' in client_data:
             self.client = client_data['client']
         else:
             # Иначе предполагаем, что передан сам объект клиента
             self.client = client_data
+        self.account = account_key(client_data)
         
-        # Файл для хранения истории публикаций
-        self.history_file = os.path.join(os.path.dirname(STORIES_DIR), 'history', 'publishing_history.json')
-        os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
+        # Пробный запуск: запросы строятся полностью, но вместо отправки
+        # записываются в dry_run_file, история ведется в отдельной базе
+        self.dry_run = dry_run
+        self.dry_run_file = str(dry_run_file)
+        
+        # Общее для процесса хранилище истории публикаций (дозапись без перезаписи всего файла)
+        self.history = get_shared_history(DRY_RUN_HISTORY_DB, legacy_file=None) if dry_run else get_shared_history()
+        # Общий кэш загруженных медиафайлов, чтобы не загружать один и тот же файл повторно
+        self.upload_cache = get_shared_upload_cache()
+        # Общий кэш пользователей с access_hash, полученными при проверке контактов
+        self.users_cache = get_shared_cache()
+        # Каталог файлов сторис с кэшированными метаданными
+        self.catalog = get_shared_catalog()
+        # Подготовка медиа к формату сторис (1080x1920 JPEG / MP4) в пуле процессов
+        self.preprocessor = get_shared_preprocessor()
+        # Замеры длительности этапов публикации
+        self.metrics = get_shared_metrics()
+        # Повторы запросов при временных ошибках и FloodWait
+        self.retry = RetryPolicy()
+        # Запись истории и кэша загрузок в отдельном потоке
+        self.writer = get_shared_writer()
+        # Записи истории, ожидающие записи в потоке записи (записываются одной транзакцией)
+        self._history_queue = deque()
+        self._history_scheduled = False
+        # Время последнего упоминания пользователей (по истории и текущим публикациям)
+        self.cooldown = get_shared_cooldown()
+        # Пользователи, отказавшиеся от упоминаний
+        self.suppression = get_shared_suppression()
 
     async def _get_random_story_file(self):
         """Получение случайного файла сторис из директории"""
-        story_files = [f for f in os.listdir(STORIES_DIR) 
-                      if os.path.isfile(os.path.join(STORIES_DIR, f)) 
-                      and f.lower().endswith(('.mp4', '.avi', '.mov', '.jpg', '.jpeg', '.png'))]
-        
-        if not story_files:
-            logger.error(f"В директории {STORIES_DIR} не найдены файлы для сторис")
-            return None
-        
-        random_file = random.choice(story_files)
-        return os.path.join(STORIES_DIR, random_file)
+        random_file = self.catalog.random_file()
+        if not random_file:
+            logger.error("В директории %s не найдены файлы для сторис", STORIES_DIR)
+        return random_file
     
     async def _get_user_by_id(self, user_id):
         """Получение объекта пользователя по ID"""
         try:
-            entity = await self.client.get_entity(user_id)
+            entity = await self.retry.call('get_entity', self.client.get_entity, user_id)
             return entity
         except Exception as e:
-            logger.error(f"Ошибка при получении пользователя с ID {user_id}: {e}")
+            logger.error("Ошибка при получении пользователя с ID %s: %s", user_id, e)
+            return None
+    
+    async def _get_account_id(self):
+        """Получение ID текущего аккаунта (берется из кэша сессии Telethon)"""
+        me = await self.client.get_me(input_peer=True)
+        return me.user_id
+    
+    async def _prepare_media(self, story_file, use_cache=True):
+        """
+        Подготовка медиа для сторис: повторно использует ранее загруженный файл
+        с тем же содержимым или загружает файл на сервер Telegram
+        
+        Args:
+            story_file (str): Путь к файлу сторис
+            use_cache (bool): Использовать ли ранее загруженное медиа
+        
+        Returns:
+            tuple: (медиа для запроса или None, хэш файла, взято ли медиа из кэша)
+        """
+        info = self.catalog.describe(story_file)
+        if not info:
+            logger.error("Неподдерживаемый формат файла: %s", story_file)
+            return None, None, False
+        file_hash = info['file_hash']
+        
+        if use_cache and not self.dry_run:
+            account_id = await self._get_account_id()
+            media = self.upload_cache.get(account_id, file_hash)
+            if media:
+                logger.info("Используем ранее загруженный файл %s", os.path.basename(story_file))
+                return media, file_hash, True
+        
+        # Загружаем подготовленную версию файла (если подготовка доступна)
+        upload_path = (await self.preprocessor.prepare([story_file])).get(story_file, story_file)
+        if upload_path != story_file:
+            info = self.catalog.describe(upload_path)
+        
+        # Загружаем файл на сервер Telegram (в пробном запуске - только описание файла)
+        if self.dry_run:
+            file = placeholder_file(upload_path)
+        else:
+            file = await self.retry.call('upload_file', self.client.upload_file, upload_path)
+        
+        # Создаем объект медиа в зависимости от типа файла
+        if info['kind'] == 'photo':
+            media = types.InputMediaUploadedPhoto(
+                file=file,
+                spoiler=False
+            )
+        else:
+            media = types.InputMediaUploadedDocument(
+                file=file,
+                mime_type=info['mime_type'],
+                attributes=[types.DocumentAttributeVideo(
+                    duration=info['duration'],  # Длительность видео в секундах
+                    w=info['width'],            # Ширина видео
+                    h=info['height'],           # Высота видео
+                    supports_streaming=True
+                )]
+            )
+        
+        return media, file_hash, False
+    
+    async def _remember_media(self, result, file_hash):
+        """Сохранение ссылки на опубликованное медиа для повторного использования"""
+        try:
+            media = extract_story_media(result)
+            if media:
+                self.writer.submit(self.upload_cache.put, await self._get_account_id(), file_hash, media)
+        except Exception as e:
+            logger.warning("Не удалось сохранить ссылку на загруженное медиа: %s", e)
+    
+    async def _send_story(self, request_data, story_file, file_hash, from_cache):
+        """
+        Отправка SendStoryRequest с повторной загрузкой файла, если ссылка на
+        ранее загруженное медиа устарела
+        """
+        try:
+            with self.metrics.timer('story_stage_seconds', stage='send_story'):
+                result = await self.retry.call(
+                    'send_story', self.client, functions.stories.SendStoryRequest(**request_data)
+                )
+        except Exception as e:
+            if not from_cache or not is_reference_error(e):
+                raise
+            logger.info("Ссылка на загруженный файл устарела (%s), загружаем файл заново", e)
+            # Через поток записи, чтобы удаление не обогнало ранее поставленную запись
+            self.writer.submit(self.upload_cache.invalidate, await self._get_account_id(), file_hash)
+            with self.metrics.timer('story_stage_seconds', stage='media_upload'):
+                media, _, _ = await self._prepare_media(story_file, use_cache=False)
+            request_data['media'] = media
+            with self.metrics.timer('story_stage_seconds', stage='send_story'):
+                result = await self.retry.call(
+                    'send_story', self.client, functions.stories.SendStoryRequest(**request_data)
+                )
+        
+        await self._remember_media(result, file_hash)
+        return result
+    
+    async def _get_input_user(self, user, account_id):
+        """
+        Получение InputPeerUser для упоминания без запросов к Telegram, если
+        access_hash пользователя уже известен для текущего аккаунта
+        
+        Args:
+            user (UserRecord): Пользователь
+            account_id (int): ID текущего аккаунта
+        
+        Returns:
+            InputPeerUser или None: Пользователь для медиа-области или None, если не найден
+        """
+        user_id = user.user_id
+        if self.dry_run:
+            # Без запросов к Telegram: access_hash из проверки контактов или заглушка
+            return types.InputPeerUser(user_id=user_id, access_hash=user.access_hash or 0)
+        access_hash = None
+        if user.account_id == account_id:
+            access_hash = user.access_hash
+        if access_hash is None:
+            access_hash = self.users_cache.get_access_hash(account_id, user_id)
+        if access_hash is not None:
+            return types.InputPeerUser(user_id=user_id, access_hash=access_hash)
+        
+        # Пользователь еще не разрешался этим аккаунтом - запрашиваем и запоминаем
+        entity = await self._get_user_by_id(user_id)
+        if not entity:
             return None
+        input_user = await self.client.get_input_entity(entity)
+        self.users_cache.put_access_hash(account_id, user_id, getattr(input_user, 'access_hash', None))
+        return input_user
     
-    async def check_stories_available(self):
+    async def check_stories_available(self, force=False):
         """
         Проверяет, доступна ли публикация сторис для текущего аккаунта
         
+        Результат кэшируется для клиента на STORIES_CHECK_TTL секунд
+        
+        Args:
+            force (bool): Выполнить проверку заново, не используя кэш
+        
         Returns:
             bool: True, если публикация сторис доступна
         """
+        cached = _stories_availability.get(self.client)
+        if not force and cached and time.monotonic() - cached[0] < STORIES_CHECK_TTL:
+            return cached[1]
+        
         try:
             # Получаем информацию о текущем пользователе
-            me = await self.client.get_me()
-            logger.info(f"Текущий пользователь: @{me.username if me.username else me.id}")
+            me = await self.retry.call('get_me', self.client.get_me)
+            logger.info("Текущий пользователь: @%s", me.username if me.username else me.id)
             
             # Проверяем разрешения и настройки аккаунта
-            full_user = await self.client(functions.users.GetFullUserRequest(
+            full_user = await self.retry.call('get_full_user', self.client, functions.users.GetFullUserRequest(
                 id=me.id
             ))
             
-            # Логируем информацию о возможностях аккаунта
-            stripped_info = str(full_user)[:500] + "..." if len(str(full_user)) > 500 else str(full_user)
-            logger.info(f"Информация об аккаунте: {stripped_info}")
+            # Логируем только флаги, влияющие на публикацию сторис
+            stories_unavailable = bool(getattr(full_user.full_user, 'stories_unavailable', False))
+            logger.info("Информация об аккаунте: premium=%s, stories_unavailable=%s",
+                        getattr(me, 'premium', None), stories_unavailable)
             
             # Проверяем, есть ли ограничение на публикацию сторис
-            if hasattr(full_user.full_user, 'stories_unavailable') and full_user.full_user.stories_unavailable:
+            available = True
+            if stories_unavailable:
                 logger.warning("Публикация сторис недоступна для данного аккаунта!")
-                return False
+                available = False
                 
             # Проверяем аккаунт через флаг premium - часто для сторис нужен премиум статус
-            if hasattr(me, 'premium') and not me.premium:
+            elif hasattr(me, 'premium') and not me.premium:
                 logger.warning("Аккаунт не имеет премиум статуса, это может ограничивать возможности сторис")
                 # Возвращаем True, так как это только предупреждение
             
-            return True
+            _stories_availability[self.client] = (time.monotonic(), available)
+            return available
         except Exception as e:
-            logger.error(f"Ошибка при проверке доступности сторис: {e}")
+            logger.error("Ошибка при проверке доступности сторис: %s", e)
             return False
     
+    def invalidate_stories_available(self, error=None):
+        """
+        Сбрасывает кэш проверки доступности сторис для клиента
+        
+        Args:
+            error (Exception, optional): Ошибка публикации. Если передана, кэш
+                сбрасывается только для ошибок, связанных с правами аккаунта
+        """
+        if error is not None and not any(marker in str(error) for marker in CAPABILITY_ERRORS):
+            return
+        _stories_availability.pop(self.client, None)
+    
     async def publish_story_with_mentions(self, users_to_mention, story_file=None):
         """
         Публикация сторис с упоминаниями пользователей
         
         Args:
-            users_to_mention (list): Список данных пользователей для упоминания
+            users_to_mention (list): Пользователи (UserRecord) для упоминания
             story_file (str, optional): Путь к файлу сторис. Если None, берется случайный файл.
         
         Returns:
             bool: Результат публикации
         """
         try:
+            # Пользователи из списка исключений убираются до любых запросов к Telegram
+            users_to_mention, suppressed = self.suppression.filter(users_to_mention)
+            if suppressed:
+                logger.info("Исключено %s пользователей из списка исключений", suppressed)
+            
             if not users_to_mention:
                 logger.warning("Нет пользователей для упоминания")
                 return False
                 
-            logger.info(f"Подготовка публикации сторис с {len(users_to_mention)} упоминаниями")
+            logger.info("Подготовка публикации сторис с %s упоминаниями", len(users_to_mention))
             
-            # Проверяем доступность сторис для аккаунта
-            if not await self.check_stories_available():
-                logger.error("Публикация сторис недоступна для данного аккаунта")
-                return False
+            # Проверяем доступность сторис для аккаунта (в пробном запуске запрос не выполняется
+            # и этап не учитывается в метриках)
+            if not self.dry_run:
+                with self.metrics.timer('story_stage_seconds', stage='capability_check'):
+                    stories_available = await self.check_stories_available()
+                if not stories_available:
+                    logger.error("Публикация сторис недоступна для данного аккаунта")
+                    return False
             
             # Если не указан файл сторис, берем случайный
             if not story_file:
@@ -118,189 +396,104 @@ class StoryPublisher:
                     
             # Проверяем существование файла
             if not os.path.exists(story_file):
-                logger.error(f"Файл {story_file} не найден")
+                logger.error("Файл %s не найден", story_file)
                 return False
                 
-            # Загружаем файл на сервер Telegram
-            file = await self.client.upload_file(story_file)
-            
-            # Создаем объект медиа в зависимости от типа файла
-            if story_file.endswith(('.jpg', '.jpeg', '.png')):
-                media = types.InputMediaUploadedPhoto(
-                    file=file,
-                    spoiler=False
-                )
-            elif story_file.endswith(('.mp4', '.avi', '.mov')):
-                media = types.InputMediaUploadedDocument(
-                    file=file,
-                    mime_type='video/mp4',
-                    attributes=[types.DocumentAttributeVideo(
-                        duration=15,  # Длительность видео в секундах
-                        w=1080,       # Ширина видео
-                        h=1920,       # Высота видео
-                        supports_streaming=True
-                    )]
-                )
-            else:
-                logger.error(f"Неподдерживаемый формат файла: {story_file}")
+            # Получаем медиа: ранее загруженное с тем же содержимым или загружаем файл
+            with self.metrics.timer('story_stage_seconds', stage='media_upload'):
+                media, file_hash, from_cache = await self._prepare_media(story_file)
+            if not media:
                 return False
                 
-            # Базовый текст подписи
-            caption = "Тестирую авто упоминание в сторис! Если интересно то напиши свой ник телеграм в коментарий под постом о сторис https://t.me/+VwfeREo_kNNkMjQ6                                               "
-            entities = []
-            media_areas = []
+            # Получаем объекты пользователей для упоминаний (из кэша access_hash или запросом)
+            account_id = None if self.dry_run else await self._get_account_id()
+            mention_limit = min(MAX_MENTIONS_PER_STORY, MAX_TAGS)
+            if len(users_to_mention) > MAX_MENTIONS_PER_STORY:
+                logger.warning("Превышено максимальное количество упоминаний (%s)", MAX_MENTIONS_PER_STORY)
             
-            # Добавляем упоминания пользователей - как теги на медиа и в подпись
-            offset = len(caption)
-            
-            # Расчет позиций для тегов на медиа с учетом размера изображения
-            # Размещаем теги по вертикали (в колонку)
-            tag_width = 0.3  # 30% от ширины экрана
-            tag_height = 0.05  # 5% от высоты экрана
-            spacing = 0.01  # Промежуток между тегами (1% от высоты)
-            start_x = 0.05  # Начальная позиция по X (5% от левого края)
-            start_y = 0.15  # Начальная позиция по Y (15% от верха)
-            
-            for i, user_data in enumerate(users_to_mention):
-                try:
-                    # Ограничиваем количество упоминаний
-                    if i >= MAX_MENTIONS_PER_STORY:
-                        logger.warning(f"Превышено максимальное количество упоминаний ({MAX_MENTIONS_PER_STORY})")
+            mentions = []
+            with self.metrics.timer('story_stage_seconds', stage='entity_resolution'):
+                for user in users_to_mention:
+                    if len(mentions) >= mention_limit:
                         break
-                        
-                    # Получаем объект пользователя
-                    input_user = await self._get_user_by_id(user_data['user_id'])
-                    if not input_user:
-                        continue
-                    
-                    # Расчет координат для текущего тега (позицию Y увеличиваем для каждого тега)
-                    current_y = start_y + (i * (tag_height + spacing))
-                    
-                    # Если тег выходит за пределы допустимой области
-                    if current_y + tag_height > 0.9:  # Не размещаем ниже 90% высоты
-                        logger.warning(f"Не удалось разместить все упоминания на сторис - не хватает места")
-                        break
-                    
-                    # Создаем медиа-область для тега пользователя
                     try:
-                        input_entity = await self.client.get_input_entity(input_user)
-                        media_areas.append(types.InputMediaAreaChannelPost(
-                            coordinates=types.MediaAreaCoordinates(
-                                x=start_x,
-                                y=current_y,
-                                w=tag_width,
-                                h=tag_height,
-                                rotation=0.0
-                            ),
-                            channel=input_entity,
-                            msg_id=0  # 0 означает тег пользователя без конкретного сообщения
-                        ))
+                        input_user = await self._get_input_user(user, account_id)
+                        if input_user:
+                            mentions.append((user, input_user))
                     except Exception as e:
-                        logger.error(f"Ошибка при создании медиа-области для {user_data['username']}: {e}")
-                    
-                    # Также добавляем упоминание в текст подписи
-                    mention_text = f"@{user_data['username']} "
-                    caption += mention_text
-                    
-                    # Создаем entity для упоминания в подписи
-                    entities.append(types.MessageEntityMention(
-                        offset=offset,
-                        length=len(mention_text.strip())
-                    ))
-                    
-                    offset += len(mention_text)
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка при добавлении упоминания пользователя {user_data['username']}: {e}")
-                    continue
+                        logger.error("Ошибка при добавлении упоминания пользователя %s: %s", user.mention, e)
+            
+            # Добавляем упоминания пользователей - как теги на медиа и в подпись
+            with self.metrics.timer('story_stage_seconds', stage='caption_build'):
+                caption, entities, media_areas = build_story_layout(mentions)
+            # Упомянутыми считаются только пользователи с упоминанием в подписи (теги на медиа отключены):
+            # не поместившиеся на сторис, неразрешенные и пользователи без юзернейма в историю
+            # и индекс упоминаний не попадают и могут быть упомянуты в следующих сторис
+            mentioned = [user for user, _ in mentions[:len(media_areas)] if user.username]
+            if len(mentioned) < len(users_to_mention):
+                logger.warning("Не упомянуто %s пользователей из %s", len(users_to_mention) - len(mentioned),
+                               len(users_to_mention))
             
             # Настройки приватности (публично для всех)
             privacy_rules = [types.InputPrivacyValueAllowAll()]
             
             # Публикуем сторис с помощью метода stories.SendStoryRequest
-            # Telegram ожидает значение period в секундах (86400 = 24 часа)
-            try:
-                # Подготавливаем медиа и другие данные для запроса
-                request_data = {
-                    'peer': types.InputPeerSelf(),  # Используем InputPeerSelf() вместо 'me'
-                    'media': media,
-                    'privacy_rules': privacy_rules,
-                    'period': 86400  # 24 часа в секундах
-                }
-                
-                # Добавляем опциональные параметры только если они не пустые
-                if caption:
-                    request_data['caption'] = caption
-                if entities:
-                    request_data['entities'] = entities
-                # ВРЕМЕННО ОТКЛЮЧАЕМ ТЕГИ НА ИЗОБРАЖЕНИИ ДЛЯ ПРОВЕРКИ РАБОТОСПОСОБНОСТИ
-                # if media_areas:
-                #     request_data['media_areas'] = media_areas
-                
-                result = await self.client(functions.stories.SendStoryRequest(**request_data))
+            # Временные ошибки и FloodWait повторяются политикой повторов, другой
+            # период пробуется только если сервер отклонил сам период
+            request_data = {
+                'peer': types.InputPeerSelf(),  # Используем InputPeerSelf() вместо 'me'
+                'media': media,
+                'privacy_rules': privacy_rules
+            }
+            
+            # Добавляем опциональные параметры только если они не пустые
+            if caption:
+                request_data['caption'] = caption
+            if entities:
+                request_data['entities'] = entities
+            # ВРЕМЕННО ОТКЛЮЧАЕМ ТЕГИ НА ИЗОБРАЖЕНИИ ДЛЯ ПРОВЕРКИ РАБОТОСПОСОБНОСТИ
+            # if media_areas:
+            #     request_data['media_areas'] = media_areas
+            
+            if self.dry_run:
+                return await self._dry_run_story(request_data, story_file, mentioned, media_areas)
+            
+            error = None
+            for period in STORY_PERIODS:
+                request_data['period'] = period
+                try:
+                    await self._send_story(request_data, story_file, file_hash, from_cache)
+                except Exception as e:
+                    error = e
+                    if "STORY_PERIOD_INVALID" in str(e):
+                        logger.warning("Период %s секунд не работает: %s", period, e)
+                        continue
+                    logger.error("Ошибка при публикации сторис: %s", e)
+                    break
                 
-                logger.info(f"Сторис опубликована успешно")
+                if period == STORY_PERIODS[0]:
+                    logger.info("Сторис опубликована успешно")
+                else:
+                    logger.info("Сторис опубликована успешно с периодом %s секунд", period)
                 if caption:
-                    logger.info(f"Подпись: {caption}")
+                    logger.debug("Подпись: %s", caption)
                 
                 # Логируем успешную публикацию
-                await self._log_publication(story_file, users_to_mention)
+                await self._log_publication(story_file, mentioned)
                 
                 return True
-                
-            except Exception as e:
-                logger.error(f"Ошибка при публикации сторис: {e}")
-                
-                # Если ошибка связана с периодом, попробуем другие значения
-                if "STORY_PERIOD_INVALID" in str(e):
-                    # Различные возможные значения для period в секундах
-                    periods = [43200, 21600, 172800, 3600]  # 12, 6, 48, 1 час
-                    
-                    for period in periods:
-                        try:
-                            # Подготавливаем медиа и другие данные для запроса
-                            request_data = {
-                                'peer': types.InputPeerSelf(),  # Используем InputPeerSelf() вместо 'me'
-                                'media': media,
-                                'privacy_rules': privacy_rules,
-                                'period': period
-                            }
-                            
-                            # Добавляем опциональные параметры только если они не пустые
-                            if caption:
-                                request_data['caption'] = caption
-                            if entities:
-                                request_data['entities'] = entities
-                            # ВРЕМЕННО ОТКЛЮЧАЕМ ТЕГИ НА ИЗОБРАЖЕНИИ ДЛЯ ПРОВЕРКИ РАБОТОСПОСОБНОСТИ
-                            # if media_areas:
-                            #     request_data['media_areas'] = media_areas
-                            
-                            result = await self.client(functions.stories.SendStoryRequest(**request_data))
-                            
-                            logger.info(f"Сторис опубликована успешно с периодом {period} секунд")
-                            if caption:
-                                logger.info(f"Подпись: {caption}")
-                                
-                            # Логируем успешную публикацию
-                            await self._log_publication(story_file, users_to_mention)
-                            
-                            return True
-                            
-                        except Exception as e2:
-                            logger.warning(f"Период {period} секунд не работает: {e2}")
-                            await asyncio.sleep(1)
-                
-                # Если ни один период не сработал, возвращаем ошибку
-                logger.error(f"Не удалось опубликовать сторис с разными периодами")
-                
-                # Логируем неудачную публикацию
-                await self._log_publication(story_file, users_to_mention, success=False, 
-                                           error=f"Не удалось опубликовать сторис: {e}")
-                
-                return False
+            
+            # Права аккаунта могли измениться - проверим их заново перед следующей сторис
+            self.invalidate_stories_available(error)
+            
+            # Логируем неудачную публикацию
+            await self._log_publication(story_file, users_to_mention, success=False, 
+                                       error=f"Не удалось опубликовать сторис: {error}")
+            
+            return False
                 
         except Exception as e:
-            logger.error(f"Непредвиденная ошибка при публикации сторис: {e}")
+            logger.error("Непредвиденная ошибка при публикации сторис: %s", e)
             
             # Логируем неудачную публикацию
             await self._log_publication(story_file, users_to_mention, success=False, 
@@ -308,13 +501,36 @@ class StoryPublisher:
             
             return False
     
+    async def _dry_run_story(self, request_data, story_file, mentioned, media_areas):
+        """
+        Пробная публикация: запрос SendStoryRequest сериализуется и записывается
+        в файл вместо отправки
+        
+        Returns:
+            bool: True, если запрос успешно построен
+        """
+        request_data['period'] = STORY_PERIODS[0]
+        with self.metrics.timer('story_stage_seconds', stage='request_serialize'):
+            line = serialize_request(
+                functions.stories.SendStoryRequest(**request_data),
+                account=self.account,
+                story_file=os.path.basename(story_file),
+                mentions=[user.mention for user in mentioned],
+                media_areas=len(media_areas)
+            )
+        self.writer.submit(append_lines, self.dry_run_file, [line])
+        logger.info("Пробный запуск: запрос сторис с %s упоминаниями записан в %s", len(mentioned), self.dry_run_file)
+        await self._log_publication(story_file, mentioned)
+        return True
+    
     async def _log_publication(self, story_file, users_mentioned, success=True, error=None):
         """
         Логирует информацию о публикации сторис в историю
         
         Args:
             story_file (str): Путь к файлу сторис
-            users_mentioned (list): Список пользователей, упомянутых в сторис
+            users_mentioned (list): Пользователи, упомянутые в сторис (для неудачной публикации -
+                пользователи, которых собирались упомянуть)
             success (bool): Успешна ли публикация
             error (str, optional): Сообщение об ошибке, если публикация не удалась
         """
@@ -323,35 +539,41 @@ class StoryPublisher:
             history_entry = {
                 "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "story_file": os.path.basename(story_file),
-                "users_mentioned": [user.get('username', user.get('user_id', 'Unknown')) for user in users_mentioned],
+                "users_mentioned": [user.mention for user in users_mentioned],
                 "success": success
             }
             
             if error:
                 history_entry["error"] = str(error)
                 
-            # Проверяем существование файла истории
-            history = []
-            if os.path.exists(self.history_file):
-                try:
-                    with open(self.history_file, 'r', encoding='utf-8') as f:
-                        history = json.load(f)
-                except (json.JSONDecodeError, IOError) as e:
-                    logger.warning(f"Ошибка чтения файла истории: {e}")
-            
-            # Добавляем новую запись
-            history.append(history_entry)
-            
-            # Сохраняем файл истории
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
-                
-            logger.debug(f"Информация о публикации сохранена в историю")
+            # Дописываем запись в хранилище истории в потоке записи. Записи, накопившиеся,
+            # пока поток записи занят, сохраняются вместе одной транзакцией
+            self._history_queue.append(history_entry)
+            if not self._history_scheduled:
+                self._history_scheduled = True
+                self.writer.submit(self._write_history)
+            if success and not self.dry_run:
+                self.cooldown.record(users_mentioned)
+            self.metrics.inc('stories_published_total', result='success' if success else 'failure')
             
         except Exception as e:
-            logger.error(f"Ошибка при логировании публикации: {e}")
+            logger.error("Ошибка при логировании публикации: %s", e)
+    
+    def _write_history(self):
+        """Запись накопившихся записей в хранилище истории (выполняется в потоке записи)"""
+        # Флаг сбрасывается до выборки: запись, добавленная позже, запланирует новую запись
+        self._history_scheduled = False
+        entries = []
+        while self._history_queue:
+            entries.append(self._history_queue.popleft())
+        if not entries:
+            return
+        with self.metrics.timer('story_stage_seconds', stage='history_write'):
+            self.history.append_many(entries)
+        logger.debug("Информация о %s публикациях сохранена в историю", len(entries))
     
-    async def batch_publish_stories(self, all_users, stories_per_batch=1, delay=DELAY_BETWEEN_STORIES):
+    async def batch_publish_stories(self, all_users, stories_per_batch=1, delay=DELAY_BETWEEN_STORIES,
+                                    cooldown=MENTION_COOLDOWN):
         """
         Пакетная публикация нескольких сторис
         
@@ -359,11 +581,16 @@ class StoryPublisher:
             all_users (list): Список всех пользователей для упоминания
             stories_per_batch (int): Количество сторис в одной пакетной публикации
             delay (int): Задержка между публикациями в секундах
+            cooldown (float): Не упоминать пользователей, упомянутых за последние N секунд
         
         Returns:
             int: Количество успешно опубликованных сторис
         """
         try:
+            # Недавно упомянутые пользователи пропускаются до любых запросов к Telegram
+            all_users, skipped = self.cooldown.filter(all_users, cooldown)
+            if skipped:
+                logger.info("Пропущено %s пользователей, упомянутых за последние %s с", skipped, cooldown)
             if not all_users:
                 logger.warning("Нет пользователей для упоминания")
                 return 0
@@ -375,22 +602,22 @@ class StoryPublisher:
             
             # Публикуем сторис
             successful_stories = 0
+            pacer = Pacer(delay)
             for i, batch in enumerate(user_batches):
-                if i > 0:
-                    logger.info(f"Ожидание {delay} секунд перед следующей публикацией...")
-                    await asyncio.sleep(delay)
+                # Интервал между публикациями (время самой публикации входит в интервал)
+                await pacer.wait()
                 
                 story_file = await self._get_random_story_file()
                 result = await self.publish_story_with_mentions(batch, story_file)
                 
                 if result:
                     successful_stories += 1
-                    logger.info(f"Опубликована сторис {successful_stories}/{len(user_batches)}")
+                    logger.info("Опубликована сторис %s/%s", successful_stories, len(user_batches))
                 else:
-                    logger.warning(f"Не удалось опубликовать сторис {i+1}/{len(user_batches)}")
+                    logger.warning("Не удалось опубликовать сторис %s/%s", i+1, len(user_batches))
             
             return successful_stories
             
         except Exception as e:
-            logger.error(f"Ошибка при пакетной публикации сторис: {e}")
+            logger.error("Ошибка при пакетной публикации сторис: %s", e)
             return 0
@@ -0,0 +1,181 @@
+import threading
+import time
+
+from configs.settings import SUPPRESSION_DB
+from .sqlite_store import connect
+from .user_record import username_key, normalize_phone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppressed (
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    reason TEXT,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (kind, value)
+);
+"""
+
+# Виды записей списка
+USERNAME = 'username'
+USER_ID = 'user_id'
+PHONE = 'phone'
+
+
+def parse_entry(value):
+    """
+    Определение вида записи: номер телефона начинается с '+', ID состоит из
+    цифр, остальное - юзернейм (с @ или без)
+
+    Args:
+        value (str): Юзернейм, ID пользователя или номер телефона
+
+    Returns:
+        tuple: (вид записи, нормализованное значение)
+
+    Raises:
+        ValueError: Если значение пустое
+    """
+    value = str(value).strip()
+    if not value or value == '@':
+        raise ValueError("Пустое значение в списке исключений")
+    if value.startswith('+'):
+        return PHONE, normalize_phone(value)
+    if value.isdigit():
+        return USER_ID, int(value)
+    return USERNAME, username_key(value)
+
+
+class SuppressionList:
+    """
+    Постоянный список пользователей, которых нельзя упоминать (отказавшихся от упоминаний)
+
+    Записи хранятся в SQLite и при открытии загружаются в множества по видам,
+    поэтому проверка пользователя не требует запросов ни к базе, ни к Telegram
+    """
+
+    def __init__(self, db_path=SUPPRESSION_DB):
+        self.db_path = str(db_path)
+        self._lock = threading.RLock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+        self.entries = {USERNAME: set(), USER_ID: set(), PHONE: set()}
+        self.reload()
+
+    def reload(self):
+        """Повторная загрузка записей (список могли изменить из другого процесса)"""
+        entries = {USERNAME: set(), USER_ID: set(), PHONE: set()}
+        with self._lock:
+            for row in self.conn.execute("SELECT kind, value FROM suppressed"):
+                entries[row['kind']].add(int(row['value']) if row['kind'] == USER_ID else row['value'])
+            self.entries = entries
+
+    def add(self, values, reason=None):
+        """
+        Добавление пользователей в список
+
+        Args:
+            values (list): Юзернеймы, ID пользователей или номера телефонов (с '+')
+            reason (str, optional): Причина исключения
+
+        Returns:
+            int: Количество новых записей
+        """
+        parsed = [parse_entry(value) for value in values]
+        added = 0
+        with self._lock, self.conn:
+            for kind, value in parsed:
+                if value in self.entries[kind]:
+                    continue
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO suppressed (kind, value, reason, added_at) VALUES (?, ?, ?, ?)",
+                    (kind, value, reason, time.time())
+                )
+                self.entries[kind].add(value)
+                added += 1
+        return added
+
+    def remove(self, values):
+        """
+        Удаление пользователей из списка
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        parsed = [parse_entry(value) for value in values]
+        removed = 0
+        with self._lock, self.conn:
+            for kind, value in parsed:
+                if value not in self.entries[kind]:
+                    continue
+                self.conn.execute("DELETE FROM suppressed WHERE kind = ? AND value = ?", (kind, value))
+                self.entries[kind].discard(value)
+                removed += 1
+        return removed
+
+    def has_username(self, key):
+        """Проверка юзернейма (нормализованного ключа username_key)"""
+        return key in self.entries[USERNAME]
+
+    def has_phone(self, phone):
+        """Проверка нормализованного номера телефона"""
+        return phone in self.entries[PHONE]
+
+    def has_user(self, user):
+        """
+        Проверка пользователя по ID, юзернейму и номеру телефона
+
+        Args:
+            user (UserRecord): Пользователь
+
+        Returns:
+            bool: True, если пользователя нельзя упоминать
+        """
+        return (
+            user.user_id in self.entries[USER_ID]
+            or (user.username_key is not None and user.username_key in self.entries[USERNAME])
+            or (user.phone is not None and user.phone in self.entries[PHONE])
+        )
+
+    def filter(self, users):
+        """
+        Пользователи, которых можно упоминать
+
+        Returns:
+            tuple: (разрешенные пользователи, количество исключенных)
+        """
+        if not self:
+            return list(users), 0
+        allowed = [user for user in users if not self.has_user(user)]
+        return allowed, len(users) - len(allowed)
+
+    def __len__(self):
+        return sum(len(values) for values in self.entries.values())
+
+    def close(self):
+        """Закрытие соединения со списком исключений"""
+        with self._lock:
+            self.conn.close()
+
+
+_shared_suppression = None
+
+
+def get_shared_suppression():
+    """
+    Возвращает общий для процесса список исключений
+
+    Returns:
+        SuppressionList: Общий список исключений
+    """
+    global _shared_suppression
+    if _shared_suppression is None:
+        _shared_suppression = SuppressionList()
+    return _shared_suppression
+
+
+def close_shared_suppression():
+    """Закрытие общего списка исключений (следующий вызов get_shared_suppression откроет его заново)"""
+    global _shared_suppression
+    if _shared_suppression is not None:
+        _shared_suppression.close()
+        _shared_suppression = None
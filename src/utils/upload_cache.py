@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from telethon import types
+
+from configs.settings import UPLOAD_CACHE_DB, UPLOAD_CACHE_TTL
+from .sqlite_store import connect
+from .background_writer import get_shared_writer
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    account_id INTEGER NOT NULL,
+    file_hash TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    media_id INTEGER NOT NULL,
+    access_hash INTEGER NOT NULL,
+    file_reference BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (account_id, file_hash)
+);
+"""
+
+# Ошибки, после которых сохраненная ссылка на медиа больше не годится
+REFERENCE_ERRORS = (
+    'FILE_REFERENCE', 'MEDIA_EMPTY', 'MEDIA_INVALID', 'PHOTO_INVALID',
+    'DOCUMENT_INVALID', 'MEDIA_FILE_INVALID'
+)
+
+_shared_upload_cache = None
+
+# Хэши файлов по (путь, размер, время изменения), чтобы не перечитывать неизменные файлы
+_digest_memo = {}
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    Вычисляет SHA-256 содержимого файла
+
+    Результат запоминается, пока не изменятся размер или время изменения файла
+
+    Args:
+        path (str): Путь к файлу
+        chunk_size (int): Размер блока чтения в байтах
+
+    Returns:
+        str: Хэш содержимого в шестнадцатеричном виде
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _digest_memo.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+def is_reference_error(error):
+    """Проверяет, что ошибка вызвана недействительной ссылкой на загруженный файл"""
+    text = str(error)
+    return any(marker in text for marker in REFERENCE_ERRORS)
+
+
+def extract_story_media(result):
+    """
+    Извлекает серверный объект медиа (Photo или Document) из ответа SendStoryRequest
+
+    Returns:
+        Photo, Document или None
+    """
+    for update in getattr(result, 'updates', None) or []:
+        if not isinstance(update, types.UpdateStory):
+            continue
+        media = getattr(update.story, 'media', None)
+        if isinstance(media, types.MessageMediaPhoto) and isinstance(media.photo, types.Photo):
+            return media.photo
+        if isinstance(media, types.MessageMediaDocument) and isinstance(media.document, types.Document):
+            return media.document
+    return None
+
+
+class UploadCache:
+    """Кэш загруженных медиафайлов сторис по хэшу содержимого"""
+
+    def __init__(self, db_path=UPLOAD_CACHE_DB, ttl=UPLOAD_CACHE_TTL):
+        self.db_path = str(db_path)
+        self.ttl = ttl
+        # Запись в кэш выполняется в потоке записи
+        self._lock = threading.RLock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+
+    def get(self, account_id, file_hash):
+        """
+        Получение ранее загруженного медиа для повторной публикации
+
+        Args:
+            account_id (int): ID аккаунта (ссылки на медиа действительны только для него)
+            file_hash (str): Хэш содержимого файла
+
+        Returns:
+            InputMediaPhoto, InputMediaDocument или None, если медиа нет или ссылка устарела
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM uploads WHERE account_id = ? AND file_hash = ?",
+                (account_id, file_hash)
+            ).fetchone()
+        if not row:
+            return None
+        if row['created_at'] < time.time() - self.ttl:
+            get_shared_writer().submit(self.invalidate, account_id, file_hash)
+            return None
+        if row['kind'] == 'photo':
+            return types.InputMediaPhoto(id=types.InputPhoto(
+                id=row['media_id'],
+                access_hash=row['access_hash'],
+                file_reference=bytes(row['file_reference'])
+            ))
+        return types.InputMediaDocument(id=types.InputDocument(
+            id=row['media_id'],
+            access_hash=row['access_hash'],
+            file_reference=bytes(row['file_reference'])
+        ))
+
+    def put(self, account_id, file_hash, media):
+        """
+        Сохранение серверного медиа после успешной публикации
+
+        Args:
+            account_id (int): ID аккаунта
+            file_hash (str): Хэш содержимого файла
+            media (Photo или Document): Объект медиа из ответа Telegram
+        """
+        kind = 'photo' if isinstance(media, types.Photo) else 'document'
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO uploads (account_id, file_hash, kind, media_id, "
+                "access_hash, file_reference, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (account_id, file_hash, kind, media.id, media.access_hash,
+                 media.file_reference, time.time())
+            )
+
+    def invalidate(self, account_id, file_hash):
+        """Удаление устаревшей ссылки на медиа"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM uploads WHERE account_id = ? AND file_hash = ?",
+                (account_id, file_hash)
+            )
+
+    def close(self):
+        """Закрытие соединения с кэшем загрузок"""
+        with self._lock:
+            self.conn.close()
+
+
+def get_shared_upload_cache():
+    """
+    Возвращает общий для процесса кэш загрузок
+
+    Returns:
+        UploadCache: Общий кэш загрузок
+    """
+    global _shared_upload_cache
+    if _shared_upload_cache is None:
+        _shared_upload_cache = UploadCache()
+    return _shared_upload_cache
+
+
+def close_shared_upload_cache():
+    """Закрытие общего кэша загрузок"""
+    global _shared_upload_cache
+    if _shared_upload_cache is not None:
+        _shared_upload_cache.close()
+        _shared_upload_cache = None
@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from configs.settings import (
+    USERS_CACHE_DB, LEGACY_USERS_CACHE_FILE, USERS_CACHE_TTL, USERS_CACHE_MAX_ENTRIES
+)
+from .sqlite_store import connect, get_meta, set_meta
+from .user_record import UserRecord, USER_FIELDS, username_key, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username_key TEXT,
+    username TEXT,
+    phone TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users(username_key);
+CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone);
+CREATE INDEX IF NOT EXISTS idx_users_updated ON users(updated_at);
+CREATE INDEX IF NOT EXISTS idx_users_accessed ON users(accessed_at);
+CREATE TABLE IF NOT EXISTS access_hashes (
+    account_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    access_hash INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account_id, user_id)
+);
+"""
+
+# Общие экземпляры кэша на процесс (по пути к базе)
+_shared_caches = {}
+
+
+class UserCache:
+    """Постоянный кэш найденных пользователей Telegram с TTL и ограничением размера"""
+
+    def __init__(self, db_path=USERS_CACHE_DB, legacy_file=LEGACY_USERS_CACHE_FILE,
+                 ttl=USERS_CACHE_TTL, max_entries=USERS_CACHE_MAX_ENTRIES):
+        self.db_path = str(db_path)
+        self.legacy_file = str(legacy_file) if legacy_file else None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._touched = set()
+        # Запись на диск выполняется в потоке записи, а поиск - в цикле событий
+        self._lock = threading.RLock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+        self._migrate_legacy()
+        self.evict()
+
+    def _migrate_legacy(self):
+        """Однократный перенос кэша из старого файла users_cache.json"""
+        if get_meta(self.conn, 'legacy_migrated'):
+            return
+        cache = {}
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            try:
+                with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.warning("Ошибка чтения файла кэша %s: %s", self.legacy_file, e)
+                return
+        for user_data in cache.values():
+            if user_data.get('user_id'):
+                self.put(UserRecord.from_dict(user_data))
+        set_meta(self.conn, 'legacy_migrated', len(cache))
+        self.conn.commit()
+        if cache:
+            logger.info("Перенесено %s пользователей из %s", len(cache), self.legacy_file)
+
+    def _lookup(self, column, value):
+        """Поиск актуальной записи по индексированной колонке"""
+        if value is None:
+            return None
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT * FROM users WHERE {column} = ? AND updated_at >= ? "
+                f"ORDER BY updated_at DESC LIMIT 1",
+                (value, time.time() - self.ttl)
+            ).fetchone()
+            if not row:
+                return None
+            self._touched.add(row['user_id'])
+        return self._row_to_user(row)
+
+    def get_by_username(self, username):
+        """Получение пользователя из кэша по юзернейму (с @ или без)"""
+        return self._lookup('username_key', username_key(username))
+
+    def get_by_user_id(self, user_id):
+        """Получение пользователя из кэша по ID"""
+        return self._lookup('user_id', int(user_id)) if user_id is not None else None
+
+    def get_by_phone(self, phone):
+        """Получение пользователя из кэша по номеру телефона"""
+        return self._lookup('phone', normalize_phone(phone))
+
+    def put(self, user):
+        """
+        Добавляет или обновляет пользователя в кэше
+
+        Изменения видны сразу, но сохраняются на диск только при вызове flush()
+
+        Args:
+            user (UserRecord): Пользователь
+        """
+        now = time.time()
+        key = user.username_key
+        with self._lock:
+            # Юзернейм и телефон могли перейти к другому аккаунту - убираем устаревшие записи
+            if key:
+                self.conn.execute(
+                    "DELETE FROM users WHERE username_key = ? AND user_id != ?",
+                    (key, user.user_id)
+                )
+            self.conn.execute(
+                "INSERT INTO users (user_id, username_key, username, phone, first_name, last_name, "
+                "updated_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET "
+                "username_key = excluded.username_key, username = excluded.username, "
+                "phone = COALESCE(excluded.phone, users.phone), "
+                "first_name = excluded.first_name, last_name = excluded.last_name, "
+                "updated_at = excluded.updated_at, accessed_at = excluded.accessed_at",
+                (
+                    user.user_id, key, user.username, user.phone,
+                    user.first_name, user.last_name, now, now
+                )
+            )
+
+    def put_many(self, users):
+        """Добавляет в кэш несколько пользователей"""
+        with self._lock:
+            for user in users:
+                self.put(user)
+
+    def get_access_hash(self, account_id, user_id):
+        """
+        Получение access_hash пользователя для конкретного аккаунта
+
+        Access hash выдается Telegram каждому аккаунту отдельно, поэтому хранится по паре
+        (аккаунт, пользователь)
+
+        Returns:
+            int или None: Access hash, если пользователь уже разрешался этим аккаунтом
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT access_hash FROM access_hashes WHERE account_id = ? AND user_id = ?",
+                (account_id, user_id)
+            ).fetchone()
+        return row['access_hash'] if row else None
+
+    def put_access_hash(self, account_id, user_id, access_hash):
+        """Сохранение access_hash пользователя для аккаунта (до вызова flush())"""
+        if access_hash is None:
+            return
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO access_hashes (account_id, user_id, access_hash, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (account_id, user_id, access_hash, time.time())
+            )
+
+    def flush(self):
+        """Сохранение накопленных изменений кэша на диск одной транзакцией"""
+        with self._lock:
+            if self._touched:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE users SET accessed_at = ? WHERE user_id = ?",
+                    [(now, user_id) for user_id in self._touched]
+                )
+                self._touched.clear()
+            self.conn.commit()
+
+    def evict(self):
+        """
+        Удаление устаревших записей и вытеснение давно не использованных при превышении размера
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        removed = self.conn.execute(
+            "DELETE FROM users WHERE updated_at < ?", (time.time() - self.ttl,)
+        ).rowcount
+        self.conn.execute(
+            "DELETE FROM access_hashes WHERE updated_at < ?", (time.time() - self.ttl,)
+        )
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            removed += self.conn.execute(
+                "DELETE FROM users WHERE user_id IN "
+                "(SELECT user_id FROM users ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            ).rowcount
+        self.conn.commit()
+        if removed:
+            logger.info("Удалено %s устаревших пользователей из кэша", removed)
+        return removed
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    @staticmethod
+    def _row_to_user(row):
+        """Преобразование строки таблицы в запись пользователя"""
+        return UserRecord(*(row[field] for field in USER_FIELDS))
+
+    def close(self):
+        """Сохранение изменений и закрытие соединения с кэшем"""
+        self.flush()
+        self.conn.close()
+
+
+def get_shared_cache(db_path=USERS_CACHE_DB):
+    """
+    Возвращает общий для процесса экземпляр кэша пользователей
+
+    Все экземпляры ContactChecker работают с одним соединением, поэтому кэш
+    открывается один раз, а результаты разных аккаунтов не затирают друг друга
+
+    Args:
+        db_path (str): Путь к базе кэша
+
+    Returns:
+        UserCache: Общий экземпляр кэша
+    """
+    key = os.path.abspath(str(db_path))
+    cache = _shared_caches.get(key)
+    if cache is None:
+        cache = UserCache(db_path)
+        _shared_caches[key] = cache
+    return cache
+
+
+def close_shared_caches():
+    """Сохранение и закрытие всех общих экземпляров кэша"""
+    while _shared_caches:
+        _, cache = _shared_caches.popitem()
+        try:
+            cache.close()
+        except Exception as e:
+            logger.error("Ошибка при закрытии кэша пользователей: %s", e)
@@ -0,0 +1,117 @@
+# Поля пользователя в кэше и в CSV с результатами проверки
+USER_FIELDS = ('user_id', 'username', 'first_name', 'last_name', 'phone')
+
+
+def username_key(username):
+    """Нормализованный ключ юзернейма для поиска в кэше"""
+    return username.strip().lower().replace('@', '') if username else None
+
+
+def normalize_phone(phone):
+    """Нормализация номера телефона к виду +XXXXXXXXXXX"""
+    if not phone:
+        return None
+    phone = str(phone).strip()
+    return phone if phone.startswith('+') else '+' + phone
+
+
+class UserRecord:
+    """
+    Найденный пользователь Telegram
+
+    Одинаковая запись для проверки по номеру и по юзернейму: юзернейм и номер
+    нормализуются один раз при создании, а ключом пользователя служит его ID,
+    поэтому пользователь, найденный несколькими аккаунтами, учитывается один раз.
+    access_hash действителен только для аккаунта account_id.
+    """
+
+    __slots__ = ('user_id', 'username', 'username_key', 'first_name', 'last_name', 'phone',
+                 'access_hash', 'account_id')
+
+    def __init__(self, user_id, username=None, first_name=None, last_name=None, phone=None,
+                 access_hash=None, account_id=None):
+        self.user_id = int(user_id)
+        username = username.strip().replace('@', '') if username else None
+        self.username = username or None
+        self.username_key = username.lower() if username else None
+        self.first_name = first_name
+        self.last_name = last_name
+        self.phone = normalize_phone(phone)
+        self.access_hash = access_hash
+        self.account_id = account_id
+
+    @property
+    def key(self):
+        """Ключ пользователя (ID Telegram)"""
+        return self.user_id
+
+    @property
+    def mention(self):
+        """Юзернейм или ID пользователя для истории публикаций"""
+        return self.username or self.user_id
+
+    @classmethod
+    def from_entity(cls, user, username=None, phone=None):
+        """
+        Запись из объекта пользователя Telethon
+
+        Args:
+            user (User): Пользователь из ответа Telegram
+            username (str, optional): Юзернейм, по которому искали пользователя
+            phone (str, optional): Номер телефона, по которому искали пользователя
+        """
+        return cls(
+            user.id,
+            username or getattr(user, 'username', None),
+            getattr(user, 'first_name', None),
+            getattr(user, 'last_name', None),
+            phone
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """Запись из словаря (контрольные точки, старые файлы кэша); лишние ключи игнорируются"""
+        return cls(
+            data['user_id'], data.get('username'), data.get('first_name'), data.get('last_name'),
+            data.get('phone'), data.get('access_hash'), data.get('account_id')
+        )
+
+    def to_dict(self):
+        """Словарь для сериализации в JSON (без пустых полей)"""
+        data = {'user_id': self.user_id}
+        for field in ('username', 'first_name', 'last_name', 'phone', 'access_hash', 'account_id'):
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        return data
+
+    def csv_row(self):
+        """Строка CSV с колонками USER_FIELDS"""
+        return (self.user_id, self.username, self.first_name, self.last_name, self.phone)
+
+    def __eq__(self, other):
+        if not isinstance(other, UserRecord):
+            return NotImplemented
+        return self.user_id == other.user_id
+
+    def __hash__(self):
+        return hash(self.user_id)
+
+    def __repr__(self):
+        return f"UserRecord(user_id={self.user_id}, username={self.username!r})"
+
+
+def unique_users(users):
+    """
+    Пользователи без повторов (по ID) в порядке первого появления
+
+    Args:
+        users (iterable): Записи UserRecord
+
+    Returns:
+        list: Уникальные записи
+    """
+    unique = {}
+    for user in users:
+        unique.setdefault(user.key, user)
+    return list(unique.values())